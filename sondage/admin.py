@@ -1,8 +1,9 @@
 from django.contrib import admin
-from .models import Section, Question, Option, Response, ResponseOption
+from .models import Section, Question, Option, Response, ResponseOption, ReportJob
 
 admin.site.register(Section)
 admin.site.register(Question)
 admin.site.register(Option)
 admin.site.register(Response)
-admin.site.register(ResponseOption)
\ No newline at end of file
+admin.site.register(ResponseOption)
+admin.site.register(ReportJob)
\ No newline at end of file
@@ -0,0 +1,210 @@
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.db.models import Count, Max
+
+from .likert import LikertStats
+from .models import Response, ResponseOption, OptionTally
+from .schema import aget_schema, get_schema
+from .tallies import tallies_version
+
+
+def _likert_data(option, counts):
+    return {'option': option.text, **LikertStats.from_counts(counts).summary()}
+
+
+def _choice_data(question, option_counts):
+    # Mêmes lignes que l'ancien GROUP BY option__text : seules les options choisies, triées par nombre
+    rows = [
+        (option.text, option_counts[option.id])
+        for option in question.options
+        if option_counts.get(option.id)
+    ]
+    rows.sort(key=lambda row: -row[1])
+
+    total = sum(count for _, count in rows)
+    return [
+        {
+            'option': text,
+            'count': count,
+            'percentage': round((count / total * 100) if total > 0 else 0, 1)
+        }
+        for text, count in rows
+    ]
+
+
+def _tally_rows(question_ids=None):
+    rows = OptionTally.objects.filter(count__gt=0)
+    if question_ids is not None:
+        rows = rows.filter(question_id__in=question_ids)
+    return rows.values_list('question_id', 'option_id', 'likert_value', 'count')
+
+
+def load_counts(question_ids=None):
+    # Lecture des compteurs matérialisés : O(nombre d'options), quel que soit le nombre de réponses
+    counts = defaultdict(lambda: defaultdict(dict))
+    for question_id, option_id, likert_value, count in _tally_rows(question_ids):
+        counts[question_id][option_id][likert_value] = count
+    return counts
+
+
+async def aload_counts(question_ids=None):
+    counts = defaultdict(lambda: defaultdict(dict))
+    async for question_id, option_id, likert_value, count in _tally_rows(question_ids):
+        counts[question_id][option_id][likert_value] = count
+    return counts
+
+
+def text_responses_queryset(question_ids):
+    return ResponseOption.objects.filter(question_id__in=question_ids).order_by(
+        'question_id', 'id'
+    ).values_list('question_id', 'text_response')
+
+
+def iter_text_responses(question_id, chunk_size=2000):
+    # Curseur côté serveur : les réponses sont lues au fil de l'eau, jamais toutes en mémoire
+    for _, text_response in text_responses_queryset([question_id]).iterator(chunk_size=chunk_size):
+        yield text_response
+
+
+def load_text_responses():
+    texts = defaultdict(list)
+    question_ids = [question.id for question in get_schema().questions.values() if question.is_text]
+    for question_id, text_response in text_responses_queryset(question_ids):
+        texts[question_id].append(text_response)
+    return texts
+
+
+def question_stats(question, question_counts, texts=None):
+    if question.is_text:
+        return {
+            'question': question,
+            'type': 'text',
+            'responses': texts.get(question.id, []) if texts is not None else []
+        }
+    if question.is_likert:
+        return {
+            'question': question,
+            'type': 'likert',
+            'options_data': [
+                _likert_data(option, question_counts.get(option.id, {}))
+                for option in question.options
+            ]
+        }
+
+    option_counts = {
+        option_id: sum(by_value.values())
+        for option_id, by_value in question_counts.items()
+    }
+    return {
+        'question': question,
+        'type': 'multiple_choice',
+        'responses': _choice_data(question, option_counts)
+    }
+
+
+def build_report(lazy_texts=False):
+    """Statistiques de toutes les sections, avec un nombre de requêtes indépendant du volume de réponses.
+
+    Avec lazy_texts, les réponses texte sont des itérateurs sur la base, à parcourir une seule fois.
+    """
+    schema = get_schema()
+    counts = load_counts()
+    texts = None if lazy_texts else load_text_responses()
+    report_data = []
+
+    for section in schema.sections:
+        section_data = {
+            'name': section.name,
+            'questions': [
+                question_stats(question, counts.get(question.id, {}), texts)
+                for question in section.questions
+            ]
+        }
+        if lazy_texts:
+            for question_data in section_data['questions']:
+                if question_data['type'] == 'text':
+                    question_data['responses'] = iter_text_responses(question_data['question'].id)
+        report_data.append(section_data)
+
+    return report_data
+
+
+def api_question_stats(question, question_counts):
+    """Représentation JSON d'une question : compteurs par option, pourcentages, histogrammes et moyennes Likert."""
+    data = {
+        'id': question.id,
+        'number': question.number,
+        'text': question.text,
+        'section': question.section_id,
+        'type': 'text' if question.is_text else 'likert' if question.is_likert else 'multiple_choice',
+    }
+    if question.is_text:
+        return data
+
+    if question.is_likert:
+        options = [
+            {'id': option.id, 'text': option.text, **LikertStats.from_counts(question_counts.get(option.id, {})).summary()}
+            for option in question.options
+        ]
+        data['total'] = max((option['total'] for option in options), default=0)
+    else:
+        counts = [sum(question_counts.get(option.id, {}).values()) for option in question.options]
+        total = sum(counts)
+        options = [
+            {
+                'id': option.id,
+                'text': option.text,
+                'count': count,
+                'percentage': round(count / total * 100, 1) if total else 0,
+            }
+            for option, count in zip(question.options, counts)
+        ]
+        data['total'] = total
+    data['options'] = options
+    return data
+
+
+def stats_version():
+    # Change à chaque écriture des compteurs (soumission, import, suppression, reconstruction) ou du questionnaire ;
+    # un agrégat des compteurs ne suffit pas : une suppression suivie d'une soumission peut le laisser identique
+    return f"{get_schema().digest}-{tallies_version()}"
+
+
+async def astats_version():
+    return f"{(await aget_schema()).digest}-{await sync_to_async(tallies_version)()}"
+
+
+def text_answers_queryset(question_id, after=0):
+    return ResponseOption.objects.filter(
+        question_id=question_id, id__gt=after
+    ).order_by('id').values_list('id', 'text_response')
+
+
+def _text_answers_page(rows, limit):
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        'answers': [{'id': answer_id, 'text': text} for answer_id, text in rows],
+        'next': rows[-1][0] if has_more else None,
+    }
+
+
+def text_answers_page(question_id, after=0, limit=50):
+    """Page de réponses texte par pagination sur clé (id), stable même pendant l'arrivée de nouvelles réponses."""
+    return _text_answers_page(list(text_answers_queryset(question_id, after)[:limit + 1]), limit)
+
+
+async def atext_answers_page(question_id, after=0, limit=50):
+    return _text_answers_page([row async for row in text_answers_queryset(question_id, after)[:limit + 1]], limit)
+
+
+def data_version():
+    """Identifie l'état des données du rapport : structure du questionnaire et réponses reçues."""
+    stats = Response.objects.aggregate(last_id=Max('id'), total=Count('id'))
+    return f"{get_schema().digest}-{stats['last_id'] or 0}-{stats['total']}"
+
+
+async def adata_version():
+    stats = await Response.objects.aaggregate(last_id=Max('id'), total=Count('id'))
+    return f"{(await aget_schema()).digest}-{stats['last_id'] or 0}-{stats['total']}"
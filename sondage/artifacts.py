@@ -0,0 +1,115 @@
+import hashlib
+import os
+import tempfile
+import time
+
+from django.conf import settings
+
+from .reports import REPORT_FORMATS
+
+
+def artifact_key(kind, version):
+    # Le nom du fichier dépend uniquement du type de rapport et de la version des données
+    return hashlib.sha256(f'{kind}:{version}'.encode()).hexdigest()[:32]
+
+
+def artifact_path(kind, version):
+    extension, _ = REPORT_FORMATS[kind]
+    return os.path.join(settings.REPORTS_ROOT, f'{kind}-{artifact_key(kind, version)}.{extension}')
+
+
+def find_artifact(kind, version):
+    path = artifact_path(kind, version)
+    if not os.path.exists(path):
+        return None
+    # La date de modification sert d'horodatage de dernier accès pour l'éviction
+    os.utime(path)
+    return path
+
+
+def _temporary_file(kind):
+    # Nom unique : plusieurs threads du même processus peuvent produire le même artefact
+    os.makedirs(settings.REPORTS_ROOT, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=f'{kind}-', suffix='.tmp', dir=settings.REPORTS_ROOT)
+    return os.fdopen(fd, 'wb'), tmp_path
+
+
+def _resolve(version):
+    # Version connue d'avance, ou fonction appelée une fois l'écriture terminée (version des données effectivement lues)
+    return version() if callable(version) else version
+
+
+def store_artifact(kind, version, write):
+    """Écrit l'artefact via `write(output)` de façon atomique et retourne son chemin."""
+    output, tmp_path = _temporary_file(kind)
+    try:
+        with output:
+            write(output)
+        path = artifact_path(kind, _resolve(version))
+        os.replace(tmp_path, path)
+    finally:
+        _remove(tmp_path)
+    evict_artifacts(keep=path)
+    return path
+
+
+def stream_artifact(kind, version, chunks):
+    """Relaie les morceaux produits en les enregistrant ; l'artefact n'est conservé que si le flux va jusqu'au bout.
+
+    Une version résolue à None (données modifiées pendant le flux) n'enregistre rien.
+    """
+    output, tmp_path = _temporary_file(kind)
+    path = None
+    try:
+        with output:
+            for chunk in chunks:
+                output.write(chunk)
+                yield chunk
+        version = _resolve(version)
+        if version is not None:
+            path = artifact_path(kind, version)
+            os.replace(tmp_path, path)
+    finally:
+        # Client déconnecté ou erreur : le fichier partiel est abandonné
+        _remove(tmp_path)
+    if path is not None:
+        evict_artifacts(keep=path)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass  # Déjà supprimé par un autre processus
+
+
+def evict_artifacts(keep=None, max_age=None, max_bytes=None):
+    """Supprime les artefacts trop anciens, puis les moins récemment utilisés au-delà de la taille maximale."""
+    max_age = settings.REPORTS_MAX_AGE if max_age is None else max_age
+    max_bytes = settings.REPORTS_MAX_BYTES if max_bytes is None else max_bytes
+    if not os.path.isdir(settings.REPORTS_ROOT):
+        return []
+
+    now = time.time()
+    artifacts = []
+    removed = []
+    for entry in os.scandir(settings.REPORTS_ROOT):
+        if not entry.is_file() or entry.name.endswith('.tmp'):
+            continue
+        stat = entry.stat()
+        if entry.path != keep and now - stat.st_mtime > max_age:
+            _remove(entry.path)
+            removed.append(entry.path)
+        else:
+            artifacts.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in artifacts)
+    for _, size, path in sorted(artifacts):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        _remove(path)
+        removed.append(path)
+        total -= size
+    return removed
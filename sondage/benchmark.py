@@ -0,0 +1,155 @@
+import io
+import platform
+import random
+import statistics
+import subprocess
+import tempfile
+import time
+
+import django
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .aggregation import build_report
+from .jobs import claim_next_job, run_job
+from .models import Response
+from .reports import write_report
+from .schema import get_schema
+from .seeding import random_form_data, seed_responses
+
+# submit_survey en dernier : chaque soumission ajoute une réponse au volume mesuré
+ENDPOINTS = ('survey_form', 'admin_stats', 'export_csv', 'export_word', 'export_pdf', 'build_word', 'build_pdf', 'submit_survey')
+RESPONSES_PER_USER = 4
+BENCHMARK_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'sondage-benchmark'}}
+
+
+def percentile(samples, fraction):
+    # Rang le plus proche, sur un échantillon trié
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(fraction * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def _consume(response):
+    # Les réponses en streaming ne sont produites (et les requêtes exécutées) qu'à la lecture
+    if response.streaming:
+        return sum(len(chunk) for chunk in response.streaming_content)
+    return len(response.content)
+
+
+def measure(call, requests, warmup=1):
+    """Appelle `call()` `requests` fois et retourne débit, latences et nombre de requêtes SQL."""
+    for _ in range(warmup):
+        call()
+
+    latencies = []
+    queries = []
+    started = time.perf_counter()
+    for _ in range(requests):
+        with CaptureQueriesContext(connection) as captured:
+            begin = time.perf_counter()
+            call()
+            latencies.append(time.perf_counter() - begin)
+        queries.append(len(captured.captured_queries))
+    elapsed = time.perf_counter() - started
+
+    return {
+        'requests': requests,
+        'requests_per_second': round(requests / elapsed, 2) if elapsed else None,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 2),
+        'queries': int(statistics.median(queries)),
+        'queries_max': max(queries),
+    }
+
+
+def _endpoint_calls(client, rng):
+    def get(name, query=''):
+        url = reverse(f'sondage:{name}') + query
+
+        def call():
+            response = client.get(url)
+            assert response.status_code == 200, f'{url}: {response.status_code}'
+            return _consume(response)
+        return call
+
+    def submit():
+        response = client.post(reverse('sondage:submit_survey'), random_form_data(get_schema(), rng))
+        assert response.status_code == 200, f'submit_survey: {response.status_code}'
+        return len(response.content)
+
+    def build(kind):
+        # Génération complète du rapport, sans passer par le cache d'artefacts
+        return lambda: write_report(kind, build_report(), io.BytesIO())
+
+    return {
+        'survey_form': get('survey_form'),
+        'submit_survey': submit,
+        'admin_stats': get('admin_stats'),
+        'export_csv': get('admin_export_responses', '?format=csv'),
+        # Word et PDF via HTTP : l'artefact est produit à l'avance, on mesure son service
+        'export_word': get('admin_stats_word'),
+        'export_pdf': get('admin_stats_pdf'),
+        'build_word': build('word'),
+        'build_pdf': build('pdf'),
+    }
+
+
+def _prime_artifact(client, kind):
+    # Le rapport est normalement produit par run_report_jobs : on l'exécute ici en ligne
+    _consume(client.get(reverse(f'sondage:admin_stats_{kind}')))
+    while (job := claim_next_job()) is not None:
+        run_job(job)
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(sizes, requests=20, warmup=1, endpoints=ENDPOINTS, seed=0):
+    """Mesure chaque vue pour chaque volume de réponses demandé ; la base courante doit contenir le questionnaire."""
+    rng = random.Random(seed)
+    results = {
+        'commit': current_commit(),
+        'started_at': timezone.now().isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'requests': requests,
+        'sizes': [],
+    }
+
+    with tempfile.TemporaryDirectory() as reports_root, override_settings(
+        CACHES=BENCHMARK_CACHES, REPORTS_ROOT=reports_root, REPORT_RENDER_WORKERS=0,
+    ):
+        admin, _ = User.objects.get_or_create(username='bench_admin', defaults={'is_staff': True})
+        client = Client()
+        client.force_login(admin)
+        calls = _endpoint_calls(client, rng)
+
+        for size in sorted(sizes):
+            missing = size - Response.objects.count()
+            if missing > 0:
+                seed_responses(max(1, missing // RESPONSES_PER_USER), missing, seed=rng.random())
+            actual = Response.objects.count()
+            for kind in ('word', 'pdf'):
+                if f'export_{kind}' in endpoints:
+                    _prime_artifact(client, kind)
+
+            measurements = {
+                name: measure(calls[name], requests, warmup)
+                for name in ENDPOINTS if name in endpoints
+            }
+            results['sizes'].append({'size': size, 'responses': actual, 'endpoints': measurements})
+
+    return results
@@ -0,0 +1,243 @@
+import threading
+from dataclasses import dataclass
+from itertools import islice
+
+import numpy as np
+from django.db.models import Max
+from django.db.models.functions import Coalesce
+
+from .aggregation import data_version
+from .likert import LIKERT_SCALE, LikertStats
+from .models import Response, ResponseOption
+from .schema import get_schema
+from .snapshot import is_current, open_snapshot
+
+MISSING = -1
+BATCH_SIZE = 50000  # Réponses converties en tableau NumPy à la fois
+
+
+class CrosstabError(ValueError):
+    pass
+
+
+@dataclass(frozen=True, slots=True)
+class ResponseMatrix:
+    version: str  # data_version : inclut l'empreinte du questionnaire qui a servi à construire les colonnes
+    rows: int
+    columns: dict  # (question_id, option_id Likert ou None) -> indice de l'option choisie ou valeur Likert par répondant, -1 si absent
+
+
+def _columns(schema):
+    # Une colonne par question à choix, une par option pour les questions Likert (comme l'export pivoté)
+    columns = {}
+    for question in schema.questions.values():
+        if question.is_text:
+            continue
+        if question.is_likert:
+            for option in question.options:
+                columns[(question.id, option.id)] = len(columns)
+        else:
+            columns[(question.id, None)] = len(columns)
+    return columns
+
+
+def _option_lookup(schema, columns):
+    # Tables indexées par id d'option : colonne de destination et indice de l'option dans sa question
+    size = max(schema.options, default=0) + 1
+    column = np.full(size, MISSING, dtype=np.int32)
+    index = np.full(size, MISSING, dtype=np.int16)
+    likert = np.zeros(size, dtype=bool)
+    for question in schema.questions.values():
+        for position, option in enumerate(question.options):
+            key = (question.id, option.id) if question.is_likert else (question.id, None)
+            if key in columns:
+                column[option.id] = columns[key]
+                index[option.id] = position
+                likert[option.id] = question.is_likert
+    return column, index, likert
+
+
+def _load_rows(schema, columns, after, last_id):
+    """Colonnes des réponses d'id compris dans ]after, last_id], en deux requêtes lues par lots."""
+    response_ids = np.fromiter(
+        Response.objects.filter(id__gt=after, id__lte=last_id).order_by('id').values_list('id', flat=True).iterator(),
+        dtype=np.int64,
+    )
+    # Ordre Fortran : chaque colonne est contiguë en mémoire
+    values = np.full((len(response_ids), len(columns)), MISSING, dtype=np.int8, order='F')
+    option_column, option_index, option_likert = _option_lookup(schema, columns)
+
+    rows = ResponseOption.objects.filter(
+        response_id__gt=after, response_id__lte=last_id, option__isnull=False
+    ).annotate(value=Coalesce('likert_value', MISSING)).values_list('response_id', 'option_id', 'value').iterator(
+        chunk_size=BATCH_SIZE
+    )
+    while batch := list(islice(rows, BATCH_SIZE)):
+        answers = np.array(batch, dtype=np.int64)
+        response_id, option_id, likert_value = answers.T
+        # Options ajoutées depuis la lecture du schéma : ignorées
+        known = option_id < len(option_column)
+        response_id, option_id, likert_value = response_id[known], option_id[known], likert_value[known]
+        column = option_column[option_id]
+        row = np.searchsorted(response_ids, response_id)
+        valid = (column != MISSING) & (row < len(response_ids))
+        valid[valid] &= response_ids[row[valid]] == response_id[valid]
+        value = np.where(option_likert[option_id], likert_value, option_index[option_id])
+        values[row[valid], column[valid]] = value[valid]
+
+    return len(response_ids), {key: values[:, index] for key, index in columns.items()}
+
+
+def _snapshot_columns(snapshot, schema, columns):
+    # Colonnes Likert lues telles quelles dans les fichiers ; ids d'options convertis en indices pour les questions à choix
+    values = {}
+    for question_id, option_id in columns:
+        if option_id is not None:
+            values[(question_id, option_id)] = snapshot.likert(question_id, option_id)
+            continue
+        question = schema.questions[question_id]
+        # Dernière case (indice -1) : réponse absente
+        position = np.full(max(schema.options, default=0) + 2, MISSING, dtype=np.int8)
+        for index, option in enumerate(question.options):
+            position[option.id] = index
+        values[(question_id, None)] = position[snapshot.choice(question_id)]
+    return values
+
+
+def load_matrix(schema, version):
+    """Matrice des réponses : instantané en colonnes s'il est à jour, complété par les réponses plus récentes."""
+    columns = _columns(schema)
+    last_id = Response.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+
+    snapshot = open_snapshot()
+    if snapshot is None or snapshot.last_id > last_id or not is_current(snapshot, schema):
+        rows, values = _load_rows(schema, columns, 0, last_id)
+        return ResponseMatrix(version=version, rows=rows, columns=values)
+
+    base = _snapshot_columns(snapshot, schema, columns)
+    rows, tail = _load_rows(schema, columns, snapshot.last_id, last_id)
+    if not rows:
+        return ResponseMatrix(version=version, rows=snapshot.rows, columns=base)
+    return ResponseMatrix(version=version, rows=snapshot.rows + rows, columns={
+        key: np.concatenate([base[key], tail[key]]) for key in columns
+    })
+
+
+_matrix = None
+_lock = threading.Lock()
+
+
+def get_matrix(version=None):
+    """Matrice des réponses, rechargée seulement quand les données ou le questionnaire changent."""
+    global _matrix
+    version = version or data_version()
+    matrix = _matrix
+    if matrix is not None and matrix.version == version:
+        return matrix
+
+    with _lock:
+        if _matrix is None or _matrix.version != version:
+            _matrix = load_matrix(get_schema(), version)
+        return _matrix
+
+
+def _question(schema, number):
+    for question in schema.questions.values():
+        if question.number == number:
+            return question
+    raise CrosstabError(f"Question inconnue : {number}")
+
+
+def parse_filters(schema, values):
+    """Filtres de la forme "Q03:12,13" (numéro de question : ids d'options acceptées)."""
+    filters = {}
+    for value in values:
+        number, _, option_ids = value.partition(':')
+        question = _question(schema, number)
+        if question.is_text or question.is_likert:
+            raise CrosstabError(f"Seules les questions à choix peuvent servir de filtre : {number}")
+        try:
+            accepted = {int(option_id) for option_id in option_ids.split(',')}
+        except ValueError:
+            raise CrosstabError(f"Filtre invalide : {value}")
+        positions = [position for position, option in enumerate(question.options) if option.id in accepted]
+        if len(positions) != len(accepted):
+            raise CrosstabError(f"Option inconnue pour {number} : {option_ids}")
+        filters[question] = positions
+    return filters
+
+
+def crosstab(matrix, question, by, filters=None):
+    """Résultats de `question` par option de `by` (question à choix), sur les répondants retenus par `filters`."""
+    if by.is_text or by.is_likert:
+        raise CrosstabError(f"Seules les questions à choix peuvent segmenter les résultats : {by.number}")
+    if question.is_text:
+        raise CrosstabError(f"Les questions texte ne se croisent pas : {question.number}")
+
+    columns = matrix.columns
+    mask = np.ones(matrix.rows, dtype=bool)
+    for filter_question, positions in (filters or {}).items():
+        mask &= np.isin(columns[(filter_question.id, None)], positions)
+
+    segment_count = len(by.options)
+    segment = columns[(by.id, None)].astype(np.int64)
+    mask &= segment != MISSING
+    totals = np.bincount(segment[mask], minlength=segment_count)
+
+    if question.is_likert:
+        scale = len(LIKERT_SCALE)
+        per_option = []
+        for option in question.options:
+            answer = columns[(question.id, option.id)].astype(np.int64)
+            selected = mask & (answer != MISSING)
+            # Groupement vectorisé : un seul bincount sur l'indice combiné (segment, valeur)
+            histograms = np.bincount(segment[selected] * scale + answer[selected] - LIKERT_SCALE.start,
+                                     minlength=segment_count * scale).reshape(segment_count, scale)
+            per_option.append((option, histograms))
+
+        def cells(index):
+            return [
+                {'id': option.id, 'text': option.text, **LikertStats(histograms[index].tolist()).summary()}
+                for option, histograms in per_option
+            ]
+    else:
+        option_count = len(question.options)
+        answer = columns[(question.id, None)].astype(np.int64)
+        selected = mask & (answer != MISSING)
+        counts = np.bincount(segment[selected] * option_count + answer[selected],
+                             minlength=segment_count * option_count).reshape(segment_count, option_count)
+
+        def cells(index):
+            total = int(counts[index].sum())
+            return [
+                {
+                    'id': option.id,
+                    'text': option.text,
+                    'count': count,
+                    'percentage': round(count / total * 100, 1) if total else 0,
+                }
+                for option, count in zip(question.options, counts[index].tolist())
+            ]
+
+    return [
+        {'id': option.id, 'text': option.text, 'total': int(totals[index]), 'options': cells(index)}
+        for index, option in enumerate(by.options)
+    ]
+
+
+def crosstab_data(number, by_number, filter_values=(), version=None):
+    """Tableau croisé au format de l'API JSON ; lève CrosstabError si la demande est invalide."""
+    schema = get_schema()
+    question = _question(schema, number)
+    by = _question(schema, by_number)
+    filters = parse_filters(schema, filter_values)
+    matrix = get_matrix(version)
+    return {
+        'version': matrix.version,
+        'question': {'id': question.id, 'number': question.number, 'text': question.text,
+                     'type': 'likert' if question.is_likert else 'multiple_choice'},
+        'by': {'id': by.id, 'number': by.number, 'text': by.text},
+        'filters': {filter_question.number: [filter_question.options[position].id for position in positions]
+                    for filter_question, positions in filters.items()},
+        'segments': crosstab(matrix, question, by, filters),
+    }
@@ -0,0 +1,164 @@
+import csv
+import json
+from collections import defaultdict
+
+from .models import Response, ResponseOption
+
+CHUNK_SIZE = 2000
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+EXPORT_LAYOUTS = ('responses', 'answers')
+
+
+def response_columns(schema):
+    # Une colonne par question, et une par option pour les questions Likert (ex. Q06.1, Q06.2...)
+    columns = []
+    for section in schema.sections:
+        for question in section.questions:
+            if question.is_likert:
+                for index, option in enumerate(question.options, start=1):
+                    columns.append(((question.id, option.id), f'{question.number}.{index}'))
+            else:
+                columns.append(((question.id, None), question.number))
+    return columns
+
+
+def _answer_value(schema, question, option_id, likert_value, text_response):
+    if question.is_text:
+        return text_response
+    if question.is_likert:
+        return likert_value
+    option = schema.options.get(option_id)
+    return option.text if option else None
+
+
+def _responses_after(after, chunk_size):
+    return Response.objects.filter(id__gt=after).order_by('id').values_list(
+        'id', 'user__username', 'created_at'
+    )[:chunk_size]
+
+
+def answers_queryset(first_id, last_id):
+    # Parcours ordonné d'une plage de response_id (index unique response, question, option)
+    return ResponseOption.objects.filter(
+        response_id__gte=first_id, response_id__lte=last_id
+    ).order_by('response_id', 'question_id', 'option_id').values_list(
+        'response_id', 'question_id', 'option_id', 'likert_value', 'text_response'
+    )
+
+
+def _response_chunks(chunk_size):
+    # Pagination sur clé : chaque lot de Response est suivi des réponses de la même plage d'ids
+    after = 0
+    while True:
+        responses = list(_responses_after(after, chunk_size))
+        if not responses:
+            return
+        yield responses, list(answers_queryset(responses[0][0], responses[-1][0]))
+        after = responses[-1][0]
+
+
+async def _aresponse_chunks(chunk_size):
+    after = 0
+    while True:
+        responses = [row async for row in _responses_after(after, chunk_size)]
+        if not responses:
+            return
+        yield responses, [row async for row in answers_queryset(responses[0][0], responses[-1][0])]
+        after = responses[-1][0]
+
+
+def _pivot_rows(schema, columns, responses, answers):
+    values = defaultdict(dict)
+    for response_id, question_id, option_id, likert_value, text_response in answers:
+        question = schema.questions.get(question_id)
+        if question is not None:
+            key = (question_id, option_id if question.is_likert else None)
+            values[response_id][key] = _answer_value(schema, question, option_id, likert_value, text_response)
+    for response_id, username, created_at in responses:
+        response_values = values.get(response_id, {})
+        yield [response_id, username, created_at.isoformat()] + [response_values.get(key) for key, _ in columns]
+
+
+def _answer_rows(schema, answers):
+    for response_id, question_id, option_id, likert_value, text_response in answers:
+        question = schema.questions.get(question_id)
+        option = schema.options.get(option_id)
+        yield [
+            response_id,
+            question.number if question else None,
+            option.text if option else None,
+            likert_value,
+            text_response,
+        ]
+
+
+def _chunk_rows(schema, layout, columns, responses, answers):
+    if layout == 'responses':
+        return _pivot_rows(schema, columns, responses, answers)
+    return _answer_rows(schema, answers)
+
+
+def _header(schema, layout):
+    if layout == 'responses':
+        columns = response_columns(schema)
+        return columns, ['response_id', 'username', 'created_at'] + [header for _, header in columns]
+    return None, ['response_id', 'question', 'option', 'likert_value', 'text_response']
+
+
+def iter_rows(schema, layout='responses', chunk_size=CHUNK_SIZE):
+    """En-tête puis lignes de l'export : une par Response (« responses ») ou une par ResponseOption (« answers »)."""
+    columns, header = _header(schema, layout)
+    yield header
+    for responses, answers in _response_chunks(chunk_size):
+        yield from _chunk_rows(schema, layout, columns, responses, answers)
+
+
+async def aiter_rows(schema, layout='responses', chunk_size=CHUNK_SIZE):
+    columns, header = _header(schema, layout)
+    yield header
+    async for responses, answers in _aresponse_chunks(chunk_size):
+        for row in _chunk_rows(schema, layout, columns, responses, answers):
+            yield row
+
+
+class Echo:
+    # Pseudo-fichier pour csv.writer : chaque ligne est renvoyée au lieu d'être bufferisée
+    def write(self, value):
+        return value
+
+
+def row_encoder(export_format):
+    """Fonction qui transforme une ligne en texte ; l'en-tête NDJSON sert de clés et ne produit rien."""
+    if export_format == 'ndjson':
+        header = None
+
+        def encode(row):
+            nonlocal header
+            if header is None:
+                header = row
+                return None
+            return json.dumps(dict(zip(header, row)), ensure_ascii=False) + '\n'
+        return encode
+
+    writer = csv.writer(Echo())
+    return lambda row: writer.writerow(['' if value is None else value for value in row])
+
+
+def iter_export(schema, export_format='csv', layout='responses', chunk_size=CHUNK_SIZE):
+    encode = row_encoder(export_format)
+    for row in iter_rows(schema, layout, chunk_size):
+        line = encode(row)
+        if line is not None:
+            yield line
+
+
+async def aiter_export(schema, export_format='csv', layout='responses', chunk_size=CHUNK_SIZE):
+    encode = row_encoder(export_format)
+    async for row in aiter_rows(schema, layout, chunk_size):
+        line = encode(row)
+        if line is not None:
+            yield line
@@ -0,0 +1,235 @@
+import csv
+import io
+import json
+from collections import Counter
+from dataclasses import dataclass, field
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+
+from .exports import response_columns
+from .likert import LIKERT_SCALE
+from .models import Response, ResponseOption
+from .tallies import increment_tallies
+from .terms import increment_terms, term_counts
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+BATCH_SIZE = 2000  # Répondants enregistrés par lot
+MAX_REPORTED_ERRORS = 1000
+# Colonnes de l'export « responses » acceptées telles quelles : un export peut être réimporté
+IGNORED_COLUMNS = {'response_id', 'username', 'created_at'}
+ANSWER_COLUMNS = ('response_id', 'question_id', 'option_id', 'likert_value', 'text_response')
+
+
+class IngestionError(ValueError):
+    pass
+
+
+class RowError(ValueError):
+    pass
+
+
+@dataclass
+class IngestionResult:
+    created: int = 0
+    rejected: int = 0
+    errors: list = field(default_factory=list)  # (ligne, message), limité à MAX_REPORTED_ERRORS
+
+    def reject(self, line, message):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+
+def iter_records(lines, import_format, check_header=None):
+    """(numéro de ligne, dictionnaire ou None, erreur ou None) pour chaque enregistrement du fichier."""
+    if import_format == 'csv':
+        reader = csv.DictReader(lines)
+        if check_header is not None:
+            check_header(reader.fieldnames or [])
+        for record in reader:
+            yield reader.line_num, record, None
+        return
+
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_number, None, f"JSON invalide : {e.msg}"
+            continue
+        if not isinstance(record, dict):
+            yield line_number, None, "Chaque ligne doit être un objet JSON."
+            continue
+        yield line_number, record, None
+
+
+class RecordParser:
+    """Valide un enregistrement contre le questionnaire en mémoire : clés = numéros de question, valeurs = textes d'options.
+
+    Une option Likert est désignée comme dans l'export (« Q06.1 »), par son texte (« Q06:Manque de temps »)
+    ou, en NDJSON, par un objet {texte d'option: valeur}.
+    """
+
+    def __init__(self, schema):
+        # Nom de colonne -> (question, option Likert ou None)
+        self.fields = {
+            header: (schema.questions[question_id], schema.options.get(option_id))
+            for (question_id, option_id), header in response_columns(schema)
+        }
+        for question in schema.questions.values():
+            if question.is_likert:
+                self.fields[question.number] = (question, None)
+                # Désignation par le texte : indépendante de la position de l'option
+                for option in question.options:
+                    self.fields[f'{question.number}:{option.text}'] = (question, option)
+        self.options = {
+            question.id: {option.text: option for option in question.options}
+            for question in schema.questions.values()
+        }
+
+    def check_header(self, header):
+        unknown = [name for name in header if name not in self.fields and name not in IGNORED_COLUMNS]
+        if unknown:
+            raise IngestionError(f"Colonnes inconnues : {', '.join(unknown)}")
+
+    def _likert(self, question, option, value):
+        try:
+            likert_value = int(value)
+        except (TypeError, ValueError):
+            likert_value = None
+        if likert_value not in LIKERT_SCALE:
+            raise RowError(f"Valeur Likert invalide pour {question.number} ({option.text}) : {value!r}")
+        return question.id, option.id, likert_value, None
+
+    def _answers(self, name, value):
+        question, option = self.fields.get(name, (None, None))
+        if question is None:
+            raise RowError(f"Question inconnue : {name}")
+        if option is not None:
+            return [self._likert(question, option, value)]
+
+        if question.is_text:
+            return [(question.id, None, None, str(value))]
+        if question.is_likert:
+            if not isinstance(value, dict):
+                raise RowError(f"{question.number} : objet {{option: valeur}} attendu pour une question Likert")
+            answers = []
+            for text, likert_value in value.items():
+                option = self.options[question.id].get(text)
+                if option is None:
+                    raise RowError(f"Option inconnue pour {question.number} : {text!r}")
+                answers.append(self._likert(question, option, likert_value))
+            return answers
+        option = self.options[question.id].get(str(value))
+        if option is None:
+            raise RowError(f"Option inconnue pour {question.number} : {value!r}")
+        return [(question.id, option.id, None, None)]
+
+    def parse(self, record):
+        """Retourne (nom d'utilisateur ou None, réponses) ; lève RowError avec toutes les erreurs de la ligne.
+
+        Une réponse est un tuple (question_id, option_id, likert_value, text_response) : pas d'instance de modèle par réponse.
+        """
+        answers, errors = [], []
+        for name, value in record.items():
+            if name in IGNORED_COLUMNS or value in (None, ''):
+                continue
+            try:
+                answers.extend(self._answers(name, value))
+            except RowError as e:
+                errors.append(str(e))
+        # Une réponse par question, ou par option pour les questions Likert
+        keys = [(question_id, option_id if likert_value is not None else None) for question_id, option_id, likert_value, _ in answers]
+        if len(set(keys)) != len(keys):
+            errors.append("Réponse donnée deux fois à la même question.")
+        if errors:
+            raise RowError(' ; '.join(errors))
+        if not answers:
+            raise RowError("Aucune réponse.")
+        return record.get('username') or None, answers
+
+
+def _write_copy_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        return '"' + value.replace('"', '""') + '"'
+    return str(value)
+
+
+def insert_answers(rows):
+    """Insère des lignes (ANSWER_COLUMNS) dans la table des réponses : COPY sous PostgreSQL, executemany sinon."""
+    table = connection.ops.quote_name(ResponseOption._meta.db_table)
+    columns = ', '.join(connection.ops.quote_name(name) for name in ANSWER_COLUMNS)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql' and hasattr(cursor.cursor, 'copy_expert'):
+            buffer = io.StringIO()
+            for row in rows:
+                buffer.write(','.join(_write_copy_value(value) for value in row))
+                buffer.write('\n')
+            buffer.seek(0)
+            # Champ vide non quoté = NULL, "" = chaîne vide
+            cursor.cursor.copy_expert(f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+        else:
+            placeholders = ', '.join(['%s'] * len(ANSWER_COLUMNS))
+            cursor.executemany(f"INSERT INTO {table} ({columns}) VALUES ({placeholders})", rows)
+
+
+def _flush(pending, default_user, result, tallies, terms, dry_run):
+    # Un lot : résolution des noms d'utilisateur en une requête, puis insertions groupées
+    usernames = {username for _, username, _ in pending if username}
+    user_ids = dict(User.objects.filter(username__in=usernames).values_list('username', 'id')) if usernames else {}
+    accepted = []
+    for line, username, answers in pending:
+        if username and username not in user_ids:
+            result.reject(line, f"Utilisateur inconnu : {username}")
+        else:
+            accepted.append((user_ids.get(username, default_user.pk), answers))
+    if dry_run or not accepted:
+        result.created += len(accepted)
+        return
+
+    responses = Response.objects.bulk_create([Response(user_id=user_id) for user_id, _ in accepted])
+    rows = []
+    for response, (_, answers) in zip(responses, accepted):
+        for question_id, option_id, likert_value, text_response in answers:
+            rows.append((response.pk, question_id, option_id, likert_value, text_response))
+            if option_id is not None:
+                tallies[(question_id, option_id, likert_value)] += 1
+    terms.update(term_counts((row[1], row[4]) for row in rows))
+    insert_answers(rows)
+    result.created += len(accepted)
+
+
+@transaction.atomic
+def ingest(lines, import_format, schema, user, batch_size=BATCH_SIZE, dry_run=False):
+    """Charge un lot de réponses saisies hors ligne ; les lignes invalides sont rejetées et signalées, les autres enregistrées."""
+    if import_format not in IMPORT_FORMATS:
+        raise IngestionError(f"Format inconnu : {import_format}")
+    parser = RecordParser(schema)
+    result = IngestionResult()
+    tallies, terms = Counter(), Counter()
+    pending = []
+
+    for line, record, error in iter_records(lines, import_format, parser.check_header):
+        if error is None:
+            try:
+                username, answers = parser.parse(record)
+            except RowError as e:
+                error = str(e)
+        if error is not None:
+            result.reject(line, error)
+            continue
+        pending.append((line, username, answers))
+        if len(pending) >= batch_size:
+            _flush(pending, user, result, tallies, terms, dry_run)
+            pending = []
+    if pending:
+        _flush(pending, user, result, tallies, terms, dry_run)
+
+    # Compteurs et fréquences des mots mis à jour une fois pour tout le fichier
+    increment_tallies(tallies)
+    increment_terms(terms)
+    return result
@@ -0,0 +1,109 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+
+from .aggregation import build_report, data_version
+from .models import ReportJob
+from .artifacts import store_artifact
+from .reports import write_report
+
+logger = logging.getLogger(__name__)
+
+STALE_AFTER = timedelta(minutes=30)  # Un job « en cours » plus ancien est considéré comme abandonné
+
+
+def enqueue_report(kind, user=None, fingerprint=None):
+    """Retourne le job qui produit (ou a produit) ce rapport pour l'état actuel des données, en le créant si besoin."""
+    fingerprint = fingerprint or data_version()
+    jobs = ReportJob.objects.filter(kind=kind, fingerprint=fingerprint).exclude(
+        status=ReportJob.STATUS_FAILED
+    ).order_by('-created_at')
+    for job in jobs:
+        if job.status != ReportJob.STATUS_DONE or os.path.exists(job.file_path):
+            return job
+
+    try:
+        with transaction.atomic():
+            return ReportJob.objects.create(kind=kind, fingerprint=fingerprint, requested_by=user)
+    except IntegrityError:
+        # Demande identique enregistrée entre-temps par une autre requête ; ce job a pu se terminer depuis
+        return ReportJob.objects.filter(kind=kind, fingerprint=fingerprint).order_by('-created_at', '-id').first()
+
+
+def claim_next_job():
+    # Les jobs abandonnés par un worker arrêté repartent en file d'attente
+    ReportJob.objects.filter(
+        status=ReportJob.STATUS_RUNNING,
+        started_at__lt=timezone.now() - STALE_AFTER,
+    ).update(status=ReportJob.STATUS_PENDING)
+
+    for job in ReportJob.objects.filter(status=ReportJob.STATUS_PENDING).order_by('created_at')[:10]:
+        if claim_job(job):
+            return job
+    return None
+
+
+def claim_job(job):
+    # UPDATE conditionnel : un seul worker peut passer le job à « en cours »
+    claimed = ReportJob.objects.filter(pk=job.pk, status=ReportJob.STATUS_PENDING).update(
+        status=ReportJob.STATUS_RUNNING,
+        started_at=timezone.now(),
+    )
+    if claimed:
+        job.refresh_from_db()
+    return bool(claimed)
+
+
+def run_job(job):
+    try:
+        # Le rapport reflète les données au moment du rendu, pas forcément celles de la demande (job.fingerprint)
+        version = data_version()
+
+        def rendered_version():
+            # Réponses arrivées pendant le rendu : le fichier ne correspond à aucune version, il reste hors du cache
+            return version if data_version() == version else f'{version}+job{job.pk}'
+
+        file_path = store_artifact(job.kind, rendered_version, lambda output: write_report(job.kind, build_report(lazy_texts=True), output))
+    except Exception as e:
+        logger.exception("Échec de la génération du rapport %s", job.pk)
+        job.status = ReportJob.STATUS_FAILED
+        job.error = str(e)
+    else:
+        job.status = ReportJob.STATUS_DONE
+        job.file_path = file_path
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'file_path', 'error', 'finished_at'])
+    return job
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def render_executor():
+    """Pool borné partagé par le processus web : au plus REPORT_RENDER_WORKERS rapports générés en même temps."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.REPORT_RENDER_WORKERS, thread_name_prefix='sondage-report')
+        return _executor
+
+
+def _claim_and_run(job):
+    try:
+        if claim_job(job):
+            run_job(job)
+    finally:
+        close_old_connections()
+
+
+def render_in_background(job):
+    # Sans pool configuré, le job attend le worker run_report_jobs ; sinon le premier des deux qui le réclame le traite
+    if settings.REPORT_RENDER_WORKERS > 0 and job.status == ReportJob.STATUS_PENDING:
+        render_executor().submit(_claim_and_run, job)
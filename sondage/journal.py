@@ -0,0 +1,136 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+
+from .ingestion import insert_answers
+from .models import Response
+from .submission import user_token
+from .tallies import increment_tallies
+from .terms import increment_terms, term_counts
+
+BATCH_SIZE = 1000  # Soumissions enregistrées par transaction lors du vidage
+
+_local = threading.local()
+
+
+def journal_enabled():
+    return bool(settings.SUBMISSION_JOURNAL)
+
+
+def _connection():
+    # Une connexion par thread et par fichier : sqlite3 interdit le partage entre threads
+    path = settings.SUBMISSION_JOURNAL
+    connection = getattr(_local, 'connections', {}).get(path)
+    if connection is None:
+        connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+        # WAL : les écritures des processus web ne bloquent pas le vidage ; FULL : une soumission acquittée survit à une coupure
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=FULL')
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS submissions ('
+            'token TEXT NOT NULL, user_id INTEGER NOT NULL, created_at REAL NOT NULL, answers TEXT NOT NULL, '
+            'PRIMARY KEY (token, user_id))'
+        )
+        _local.connections = {**getattr(_local, 'connections', {}), path: connection}
+    return connection
+
+
+def append_submission(user, answers, token):
+    """Ajoute une soumission validée au journal local ; un renvoi (même jeton, même utilisateur) est ignoré."""
+    rows = [(answer.question_id, answer.option_id, answer.likert_value, answer.text_response) for answer in answers]
+    _connection().execute(
+        'INSERT OR IGNORE INTO submissions (token, user_id, created_at, answers) VALUES (?, ?, ?, ?)',
+        (str(token), user.pk, time.time(), json.dumps(rows)),
+    )
+
+
+def pending_submissions():
+    return _connection().execute('SELECT COUNT(*) FROM submissions').fetchone()[0]
+
+
+def _new_entries(entries):
+    """Entrées du journal encore absentes de la base, avec le jeton sous lequel les enregistrer."""
+    # Utilisateur supprimé depuis : sa réponse l'aurait été avec lui (CASCADE)
+    users = set(User.objects.filter(id__in={user_id for _, user_id, _, _ in entries}).values_list('id', flat=True))
+    entries = [entry for entry in entries if entry[1] in users]
+    candidates = {
+        (token, user_id): (uuid.UUID(token), user_token(token, user_id)) for token, user_id, _, _ in entries
+    }
+    # Jetons déjà en base : lot validé par un autre vidage, ou validé mais pas encore retiré du journal (arrêt entre les deux)
+    saved = dict(Response.objects.filter(
+        submission_token__in=[token for pair in candidates.values() for token in pair]
+    ).values_list('submission_token', 'user_id'))
+
+    new = []
+    for token, user_id, created_at, answers in entries:
+        for candidate in candidates[(token, user_id)]:
+            if candidate not in saved:
+                new.append((candidate, user_id, created_at, answers))
+                # Réservé : une autre entrée du lot avec le même jeton passe au jeton de repli
+                saved[candidate] = user_id
+                break
+            if saved[candidate] == user_id:
+                break
+            # Jeton pris par un autre utilisateur : on essaie le jeton de repli de cet utilisateur
+    return new
+
+
+@transaction.atomic
+def _save_batch(journal_entries):
+    while True:
+        entries = _new_entries(journal_entries)
+        if not entries:
+            return 0
+        try:
+            with transaction.atomic():
+                responses = Response.objects.bulk_create([
+                    Response(user_id=user_id, submission_token=token) for token, user_id, _, _ in entries
+                ])
+            break
+        except IntegrityError:
+            # Un autre vidage a enregistré certains de ces jetons entre la lecture et l'insertion : on relit
+            continue
+    # auto_now_add impose l'heure du vidage : on rétablit l'heure de la soumission
+    for response, (_, _, created_at, _) in zip(responses, entries):
+        response.created_at = datetime.fromtimestamp(created_at, tz=timezone.utc)
+    Response.objects.bulk_update(responses, ['created_at'], batch_size=500)
+
+    rows, tallies = [], Counter()
+    for response, (_, _, _, answers) in zip(responses, entries):
+        for question_id, option_id, likert_value, text_response in json.loads(answers):
+            rows.append((response.pk, question_id, option_id, likert_value, text_response))
+            if option_id is not None:
+                tallies[(question_id, option_id, likert_value)] += 1
+    insert_answers(rows)
+    increment_tallies(tallies)
+    increment_terms(term_counts((row[1], row[4]) for row in rows))
+    return len(entries)
+
+
+def flush_submissions(batch_size=BATCH_SIZE):
+    """Vide le journal dans la base principale, par lots ; retourne le nombre de réponses enregistrées.
+
+    Chaque soumission est enregistrée exactement une fois : elle ne quitte le journal qu'après la validation
+    de son lot, un lot rejoué après un arrêt ignore les jetons déjà présents en base, et un conflit avec un
+    vidage concurrent (autre processus, autre journal) fait relire la base avant de réessayer.
+    """
+    connection = _connection()
+    saved = 0
+    while True:
+        entries = connection.execute(
+            'SELECT token, user_id, created_at, answers FROM submissions ORDER BY rowid LIMIT ?', (batch_size,)
+        ).fetchall()
+        if not entries:
+            return saved
+        saved += _save_batch(entries)
+        connection.executemany(
+            'DELETE FROM submissions WHERE token = ? AND user_id = ?', [(token, user_id) for token, user_id, _, _ in entries]
+        )
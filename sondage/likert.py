@@ -0,0 +1,131 @@
+import math
+from array import array
+
+LIKERT_SCALE = range(0, 6)  # De 0 à 5
+TOP_BOX = (4, 5)  # Les deux valeurs les plus hautes de l'échelle
+Z_95 = 1.959964  # Quantile de la loi normale pour un intervalle de confiance à 95 %
+
+
+class LikertStats:
+    """Histogramme 0–5 d'une option Likert ; toutes les statistiques en sont dérivées en temps constant.
+
+    Les histogrammes s'additionnent : une nouvelle réponse ne fait qu'incrémenter un compteur.
+    """
+
+    __slots__ = ('histogram',)
+
+    def __init__(self, histogram=None):
+        self.histogram = array('q', histogram if histogram is not None else [0] * len(LIKERT_SCALE))
+
+    @classmethod
+    def from_counts(cls, by_value):
+        # Compteurs {valeur Likert: nombre} tels que lus dans OptionTally ; les valeurs hors échelle sont ignorées
+        return cls([by_value.get(value, 0) for value in LIKERT_SCALE])
+
+    def add(self, value, count=1):
+        self.histogram[value - LIKERT_SCALE.start] += count
+
+    def __iadd__(self, other):
+        for index, count in enumerate(other.histogram):
+            self.histogram[index] += count
+        return self
+
+    def __add__(self, other):
+        merged = LikertStats(self.histogram)
+        merged += other
+        return merged
+
+    def __eq__(self, other):
+        return isinstance(other, LikertStats) and self.histogram == other.histogram
+
+    @property
+    def total(self):
+        return sum(self.histogram)
+
+    @property
+    def mean(self):
+        total = self.total
+        if not total:
+            return None
+        return sum(value * count for value, count in zip(LIKERT_SCALE, self.histogram)) / total
+
+    @property
+    def median(self):
+        total = self.total
+        if not total:
+            return None
+        # Valeurs de rang (n - 1) // 2 et n // 2 : égales si n est impair
+        ranks = [(total - 1) // 2, total // 2]
+        values = []
+        seen = 0
+        for value, count in zip(LIKERT_SCALE, self.histogram):
+            seen += count
+            while ranks and ranks[0] < seen:
+                ranks.pop(0)
+                values.append(value)
+        return sum(values) / 2
+
+    @property
+    def std_dev(self):
+        # Écart-type de l'échantillon (n - 1)
+        total = self.total
+        if total < 2:
+            return None
+        mean = self.mean
+        squares = sum(count * (value - mean) ** 2 for value, count in zip(LIKERT_SCALE, self.histogram))
+        return math.sqrt(squares / (total - 1))
+
+    @property
+    def top2_box(self):
+        # Part des réponses 4 ou 5, en pourcentage
+        total = self.total
+        if not total:
+            return None
+        return sum(self.histogram[value - LIKERT_SCALE.start] for value in TOP_BOX) / total * 100
+
+    @property
+    def confidence_interval(self):
+        # Approximation normale de l'intervalle de confiance à 95 % de la moyenne
+        std_dev = self.std_dev
+        if std_dev is None:
+            return None
+        margin = Z_95 * std_dev / math.sqrt(self.total)
+        return self.mean - margin, self.mean + margin
+
+    def summary(self):
+        """Représentation commune aux rapports, à l'API JSON et au tableau de bord."""
+        interval = self.confidence_interval
+        return {
+            'histogram': list(self.histogram),
+            'total': self.total,
+            'mean': _round(self.mean),
+            'median': self.median,
+            'std_dev': _round(self.std_dev),
+            'top2_box': _round(self.top2_box, 1),
+            'ci95': [_round(bound) for bound in interval] if interval else None,
+        }
+
+
+def _round(value, digits=2):
+    return round(value, digits) if value is not None else None
+
+
+LIKERT_HEADERS = ['Option', 'Moyenne', 'Médiane', 'Écart-type', 'Top-2', 'IC 95 %', 'Total']
+
+
+def likert_row(option_data):
+    """Ligne de tableau (Word, PDF) d'une option Likert résumée par LikertStats.summary."""
+    interval = option_data['ci95']
+    return [
+        option_data['option'],
+        _display(option_data['mean']),
+        _display(option_data['median']),
+        _display(option_data['std_dev']),
+        _display(option_data['top2_box'], '%'),
+        f'{interval[0]} – {interval[1]}' if interval else '–',
+        str(option_data['total']),
+    ]
+
+
+def _display(value, suffix=''):
+    return f'{value}{suffix}' if value is not None else '–'
@@ -0,0 +1,51 @@
+import io
+import json
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from sondage.benchmark import ENDPOINTS, run_benchmark
+
+class Command(BaseCommand):
+    help = 'Benchmark the survey views at several data sizes on a throwaway test database and print JSON results'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='0,100,1000', help="Nombres de réponses à mesurer, séparés par des virgules")
+        parser.add_argument('--requests', type=int, default=20, help="Requêtes mesurées par vue et par volume")
+        parser.add_argument('--warmup', type=int, default=1, help="Requêtes de chauffe non mesurées")
+        parser.add_argument('--endpoints', default=','.join(ENDPOINTS), help="Vues à mesurer, séparées par des virgules")
+        parser.add_argument('--seed', type=int, default=0, help="Graine aléatoire des données générées")
+        parser.add_argument('-o', '--output', help="Fichier JSON de sortie (sortie standard par défaut)")
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',') if size]
+        except ValueError:
+            raise CommandError("--sizes doit être une liste d'entiers.")
+        endpoints = [name for name in options['endpoints'].split(',') if name]
+        unknown = set(endpoints) - set(ENDPOINTS)
+        if unknown:
+            raise CommandError(f"Vues inconnues : {', '.join(sorted(unknown))}.")
+        if options['requests'] < 1:
+            raise CommandError("--requests doit être au moins 1.")
+
+        # Base de test jetable : les données générées ne touchent jamais la base réelle
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            call_command('populate_questionnaire', stdout=io.StringIO())
+            results = run_benchmark(
+                sizes, requests=options['requests'], warmup=options['warmup'], endpoints=endpoints, seed=options['seed'],
+            )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(f"Results written to {options['output']}."))
+        else:
+            self.stdout.write(output)
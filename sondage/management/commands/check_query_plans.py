@@ -0,0 +1,58 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from sondage.aggregation import text_answers_queryset, text_responses_queryset
+from sondage.exports import CHUNK_SIZE, answers_queryset
+from sondage.models import Response, ResponseOption
+from sondage.schema import get_schema
+from sondage.tallies import tallies_queryset
+
+TABLE = ResponseOption._meta.db_table
+
+# Lignes de plan signalant un parcours complet de la table des réponses
+FULL_SCAN_PATTERNS = {
+    'postgresql': re.compile(rf'Seq Scan on {TABLE}\b'),
+    'sqlite': re.compile(rf'\bSCAN {TABLE}\b(?! USING (COVERING )?INDEX)'),
+}
+
+class Command(BaseCommand):
+    help = 'Fail if a report query on ResponseOption is planned as a full table scan (run on a seeded dataset)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--analyze', action='store_true', help="Mettre à jour les statistiques du planificateur avant la vérification")
+
+    def query_shapes(self):
+        schema = get_schema()
+        text_ids = [question.id for question in schema.questions.values() if question.is_text]
+        question_id = text_ids[0] if text_ids else 0
+        first_id = Response.objects.order_by('id').values_list('id', flat=True).first() or 0
+        return [
+            ('Réponses texte du rapport', text_responses_queryset(text_ids)),
+            ('Page de réponses texte', text_answers_queryset(question_id)[:51]),
+            ('Page suivante de réponses texte', text_answers_queryset(question_id, after=1000)[:51]),
+            # Recalcul des compteurs (rebuild_tallies, check_tallies) : un parcours d'index couvrant est attendu
+            ('Recalcul des compteurs', tallies_queryset()),
+            ('Lot de réponses exportées', answers_queryset(first_id, first_id + CHUNK_SIZE - 1)),
+        ]
+
+    def handle(self, *args, **options):
+        pattern = FULL_SCAN_PATTERNS.get(connection.vendor)
+        if pattern is None:
+            raise CommandError(f"Base {connection.vendor} non prise en charge.")
+        if options['analyze']:
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE {TABLE}')
+
+        regressions = []
+        for label, queryset in self.query_shapes():
+            plan = queryset.explain()
+            ok = not pattern.search(plan)
+            self.stdout.write(f"{'OK ' if ok else 'SCAN'} {label}")
+            self.stdout.write('    ' + plan.replace('\n', '\n    '))
+            if not ok:
+                regressions.append(label)
+
+        if regressions:
+            raise CommandError(f"Parcours complet de {TABLE} pour : {', '.join(regressions)}")
+        self.stdout.write(self.style.SUCCESS('All report query plans use an index.'))
@@ -0,0 +1,24 @@
+import sys
+
+from django.core.management.base import BaseCommand
+from sondage.exports import CHUNK_SIZE, EXPORT_FORMATS, EXPORT_LAYOUTS, iter_export
+from sondage.schema import get_schema
+
+class Command(BaseCommand):
+    help = 'Stream raw survey responses as CSV or NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--layout', choices=EXPORT_LAYOUTS, default='responses',
+                            help="responses : une ligne par réponse ; answers : une ligne par option choisie")
+        parser.add_argument('--output', '-o', help="Fichier de sortie (sortie standard par défaut)")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        chunks = iter_export(get_schema(), options['format'], options['layout'], options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                output.writelines(chunks)
+            self.stderr.write(self.style.SUCCESS(f"Export written to {options['output']}"))
+        else:
+            sys.stdout.writelines(chunks)
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from sondage.journal import BATCH_SIZE, flush_submissions, journal_enabled, pending_submissions
+
+class Command(BaseCommand):
+    help = 'Drain the write-behind submission journal into the main database in batched transactions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Vider le journal puis s'arrêter")
+        parser.add_argument('--interval', type=float, default=1.0, help="Délai entre deux vidages (secondes)")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Soumissions enregistrées par transaction")
+
+    def handle(self, *args, **options):
+        if not journal_enabled():
+            raise CommandError("Mode différé inactif : définissez SUBMISSION_JOURNAL.")
+
+        while True:
+            saved = flush_submissions(batch_size=options['batch_size'])
+            if saved:
+                self.stdout.write(self.style.SUCCESS(f'{saved} submissions saved, {pending_submissions()} pending.'))
+            if options['once']:
+                return
+            time.sleep(options['interval'])
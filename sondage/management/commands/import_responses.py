@@ -0,0 +1,38 @@
+import os
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from sondage.ingestion import BATCH_SIZE, IMPORT_FORMATS, IngestionError, ingest
+from sondage.schema import get_schema
+
+class Command(BaseCommand):
+    help = 'Bulk-load survey responses collected offline from a CSV or NDJSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help="Fichier CSV (colonnes de l'export « responses ») ou NDJSON")
+        parser.add_argument('--format', choices=IMPORT_FORMATS, help="Format du fichier (déduit de l'extension par défaut)")
+        parser.add_argument('--user', required=True, help="Utilisateur associé aux lignes sans colonne username")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Répondants enregistrés par lot")
+        parser.add_argument('--dry-run', action='store_true', help="Valider le fichier sans rien enregistrer")
+
+    def handle(self, *args, **options):
+        import_format = options['format'] or os.path.splitext(options['file'])[1].lstrip('.').lower()
+        if import_format not in IMPORT_FORMATS:
+            raise CommandError("Format introuvable : précisez --format csv ou --format ndjson.")
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"Utilisateur inconnu : {options['user']}")
+
+        try:
+            with open(options['file'], encoding='utf-8', newline='') as lines:
+                result = ingest(lines, import_format, get_schema(), user,
+                                batch_size=options['batch_size'], dry_run=options['dry_run'])
+        except (OSError, IngestionError) as e:
+            raise CommandError(str(e))
+
+        for line, message in result.errors:
+            self.stdout.write(f"ligne {line} : {message}")
+        summary = f'{result.created} responses {"valid" if options["dry_run"] else "imported"}, {result.rejected} rows rejected'
+        style = self.style.WARNING if result.rejected else self.style.SUCCESS
+        self.stdout.write(style(f'{summary}.'))
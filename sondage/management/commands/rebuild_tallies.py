@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from sondage.tallies import find_drift, rebuild_tallies
+
+class Command(BaseCommand):
+    # Soumissions, imports et suppressions via l'ORM tiennent les compteurs à jour ; --check, planifié (cron),
+    # détecte les écarts laissés par des écritures en SQL brut
+    help = 'Rebuild the per-option tally table from raw responses, or check it for drift (schedule --check)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help="Vérifier les compteurs sans les reconstruire")
+
+    def handle(self, *args, **options):
+        if options['check']:
+            drift = find_drift()
+            for (question_id, option_id, likert_value), stored, expected in drift:
+                self.stdout.write(
+                    f"question={question_id} option={option_id} likert={likert_value}: stocké={stored} attendu={expected}"
+                )
+            if drift:
+                raise CommandError(f"{len(drift)} compteur(s) incohérent(s), relancez la commande sans --check.")
+            self.stdout.write(self.style.SUCCESS('Tallies are consistent with responses.'))
+            return
+
+        count = rebuild_tallies()
+        self.stdout.write(self.style.SUCCESS(f'Tallies rebuilt ({count} rows).'))
@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from sondage.terms import rebuild_terms
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-question term and bigram frequency tables from raw text answers'
+
+    def handle(self, *args, **options):
+        count = rebuild_terms()
+        self.stdout.write(self.style.SUCCESS(f'Term frequencies rebuilt ({count} rows).'))
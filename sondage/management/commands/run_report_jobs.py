@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+from sondage.jobs import claim_next_job, run_job
+
+class Command(BaseCommand):
+    help = 'Run the background worker that builds queued Word/PDF reports'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Traiter les jobs en attente puis s'arrêter")
+        parser.add_argument('--interval', type=float, default=2.0, help="Délai entre deux scrutations (secondes)")
+
+    def handle(self, *args, **options):
+        while True:
+            job = claim_next_job()
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(options['interval'])
+                continue
+
+            job = run_job(job)
+            if job.status == job.STATUS_DONE:
+                self.stdout.write(self.style.SUCCESS(f'{job} -> {job.file_path}'))
+            else:
+                self.stdout.write(self.style.ERROR(f'{job}: {job.error}'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+from sondage.seeding import seed_responses
+
+class Command(BaseCommand):
+    help = 'Seed users and random survey responses with bulk inserts, for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100, help="Nombre d'utilisateurs à créer")
+        parser.add_argument('--responses', type=int, default=1000, help="Nombre de réponses à créer")
+        parser.add_argument('--batch-size', type=int, default=500, help="Réponses insérées par lot")
+        parser.add_argument('--seed', type=int, default=None, help="Graine aléatoire, pour des données reproductibles")
+
+    def handle(self, *args, **options):
+        try:
+            users, responses = seed_responses(
+                options['users'], options['responses'], batch_size=options['batch_size'], seed=options['seed'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f'{users} users and {responses} responses created.'))
@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from sondage.snapshot import BATCH_SIZE, write_snapshot
+
+class Command(BaseCommand):
+    help = 'Append new responses to the columnar snapshot read by the analytics code (numpy.memmap)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="Reconstruire l'instantané depuis la première réponse")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Réponses ajoutées par lot")
+
+    def handle(self, *args, **options):
+        appended, rows = write_snapshot(full=options['full'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Snapshot updated in {settings.SNAPSHOT_ROOT}: {appended} responses appended, {rows} in total.'
+        ))
@@ -0,0 +1,38 @@
+# Generated by Django 5.2 on 2026-10-18 13:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_tallies(apps, schema_editor):
+    ResponseOption = apps.get_model('sondage', 'ResponseOption')
+    OptionTally = apps.get_model('sondage', 'OptionTally')
+    rows = ResponseOption.objects.filter(option__isnull=False).values(
+        'question_id', 'option_id', 'likert_value'
+    ).annotate(count=Count('id')).order_by()
+    OptionTally.objects.bulk_create([OptionTally(**row) for row in rows], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sondage', '0005_alter_response_user'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OptionTally',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('likert_value', models.IntegerField(blank=True, null=True)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('option', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tallies', to='sondage.option')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tallies', to='sondage.question')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('option', 'likert_value'), name='unique_tally_option_likert'), models.UniqueConstraint(condition=models.Q(('likert_value__isnull', True)), fields=('option',), name='unique_tally_option_choice')],
+            },
+        ),
+        migrations.RunPython(fill_tallies, migrations.RunPython.noop),
+    ]
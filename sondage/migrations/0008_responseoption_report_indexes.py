@@ -0,0 +1,21 @@
+# Generated by Django 5.2 on 2026-10-18 13:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sondage', '0007_reportjob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='responseoption',
+            index=models.Index(fields=['question', 'option', 'likert_value'], name='responseopt_q_opt_likert'),
+        ),
+        migrations.AddIndex(
+            model_name='responseoption',
+            index=models.Index(fields=['question', 'id'], name='responseopt_q_id'),
+        ),
+    ]
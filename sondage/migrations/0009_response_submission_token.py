@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 14:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sondage', '0008_responseoption_report_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='response',
+            name='submission_token',
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True),
+        ),
+    ]
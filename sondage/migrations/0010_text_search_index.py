@@ -0,0 +1,61 @@
+from django.db import migrations
+
+# Index plein texte des réponses libres, selon le moteur : GIN sur tsvector (PostgreSQL), table FTS5 (SQLite)
+POSTGRESQL_FORWARD = [
+    "CREATE INDEX responseopt_text_search ON sondage_responseoption "
+    "USING GIN (to_tsvector('french'::regconfig, COALESCE(text_response, ''))) "
+    "WHERE text_response IS NOT NULL",
+]
+POSTGRESQL_BACKWARD = ["DROP INDEX IF EXISTS responseopt_text_search"]
+
+# Table externe : FTS5 ne stocke que l'index, le texte reste dans sondage_responseoption.
+# Les triggers couvrent aussi bulk_create et les insertions directes de l'import et du journal.
+# Une migration qui reconstruit sondage_responseoption sous SQLite supprime ces triggers : les recréer ensuite.
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE sondage_text_search USING fts5("
+    "text_response, content='sondage_responseoption', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER sondage_text_search_insert AFTER INSERT ON sondage_responseoption "
+    "WHEN new.text_response IS NOT NULL BEGIN "
+    "INSERT INTO sondage_text_search (rowid, text_response) VALUES (new.id, new.text_response); END",
+    "CREATE TRIGGER sondage_text_search_delete AFTER DELETE ON sondage_responseoption "
+    "WHEN old.text_response IS NOT NULL BEGIN "
+    "INSERT INTO sondage_text_search (sondage_text_search, rowid, text_response) "
+    "VALUES ('delete', old.id, old.text_response); END",
+    "CREATE TRIGGER sondage_text_search_update AFTER UPDATE OF text_response ON sondage_responseoption BEGIN "
+    "INSERT INTO sondage_text_search (sondage_text_search, rowid, text_response) "
+    "SELECT 'delete', old.id, old.text_response WHERE old.text_response IS NOT NULL; "
+    "INSERT INTO sondage_text_search (rowid, text_response) "
+    "SELECT new.id, new.text_response WHERE new.text_response IS NOT NULL; END",
+    # Réponses existantes
+    "INSERT INTO sondage_text_search (rowid, text_response) "
+    "SELECT id, text_response FROM sondage_responseoption WHERE text_response IS NOT NULL",
+]
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS sondage_text_search_insert",
+    "DROP TRIGGER IF EXISTS sondage_text_search_delete",
+    "DROP TRIGGER IF EXISTS sondage_text_search_update",
+    "DROP TABLE IF EXISTS sondage_text_search",
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        for statement in statements.get(vendor, []):
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sondage', '0009_response_submission_token'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({'postgresql': POSTGRESQL_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            run({'postgresql': POSTGRESQL_BACKWARD, 'sqlite': SQLITE_BACKWARD}),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2 on 2026-10-18 14:21
+
+import re
+import unicodedata
+from collections import Counter
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Copie figée du découpage de sondage.terms à la date de la migration : une évolution ultérieure
+# du découpage ne doit pas changer ce que produit cette migration
+MAX_TERM_LENGTH = 50
+STOP_WORDS = frozenset('''
+    a ai aie au aussi autre autres aux avec avoir c ca car ce cela ces cet cette ceux chez comme d dans de des donc
+    du elle elles en encore entre est et etc etaient etait ete etre eu eux il ils j je l la le les leur leurs lui m
+    ma mais me meme mes moi mon n ne ni nos notre nous on ont ou par pas peu plus pour qu quand que quel quelle qui
+    s sa sans se ses si son sont sous sur t ta te tes toi ton tous tout toute toutes tres tu un une vers vos votre
+    vous y
+'''.split())
+
+
+def tokenize(text):
+    decomposed = unicodedata.normalize('NFKD', text.casefold())
+    folded = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return [
+        word for word in re.findall(r'[^\W_]+', folded)
+        if word not in STOP_WORDS and not word.isdigit() and len(word) <= MAX_TERM_LENGTH
+    ]
+
+
+def fill_terms(apps, schema_editor):
+    ResponseOption = apps.get_model('sondage', 'ResponseOption')
+    TermTally = apps.get_model('sondage', 'TermTally')
+    answers = ResponseOption.objects.filter(text_response__isnull=False).values_list('question_id', 'text_response')
+    counts = Counter()
+    for question_id, text in answers.iterator(chunk_size=2000):
+        if not text:
+            continue
+        words = tokenize(text)
+        counts.update((question_id, 1, word) for word in words)
+        counts.update((question_id, 2, f'{first} {second}') for first, second in zip(words, words[1:]))
+    TermTally.objects.bulk_create([
+        TermTally(question_id=question_id, n=n, term=term, count=count)
+        for (question_id, n, term), count in counts.items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sondage', '0010_text_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TermTally',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('n', models.PositiveSmallIntegerField()),
+                ('term', models.CharField(max_length=101)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='term_tallies', to='sondage.question')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['question', 'n', '-count'], name='termtally_top')],
+                'constraints': [models.UniqueConstraint(fields=('question', 'n', 'term'), name='unique_term_tally')],
+            },
+        ),
+        migrations.RunPython(fill_terms, migrations.RunPython.noop),
+    ]
@@ -27,6 +27,8 @@ class Option(models.Model):
 class Response(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='responses')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Identifiant de la soumission : une même soumission n'est jamais enregistrée deux fois (renvoi, journal rejoué)
+    submission_token = models.UUIDField(null=True, blank=True, unique=True, editable=False)
 
 class ResponseOption(models.Model):
     response = models.ForeignKey(Response, on_delete=models.CASCADE, related_name='selected_options')
@@ -36,4 +38,85 @@ class ResponseOption(models.Model):
     likert_value = models.IntegerField(null=True, blank=True)  # For Likert scale responses (1-5)
 
     class Meta:
-        unique_together = ('response', 'question', 'option')
\ No newline at end of file
+        unique_together = ('response', 'question', 'option')
+        indexes = [
+            # Recalcul des compteurs : GROUP BY (question, option, likert_value) couvert par l'index
+            models.Index(fields=['question', 'option', 'likert_value'], name='responseopt_q_opt_likert'),
+            # Réponses texte d'une question, paginées par id
+            models.Index(fields=['question', 'id'], name='responseopt_q_id'),
+        ]
+
+class OptionTally(models.Model):
+    # Compteur matérialisé par (question, option, valeur Likert), tenu à jour à chaque soumission
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='tallies')
+    option = models.ForeignKey(Option, on_delete=models.CASCADE, related_name='tallies')
+    likert_value = models.IntegerField(null=True, blank=True)  # Null pour les questions à choix multiples
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['option', 'likert_value'], name='unique_tally_option_likert'),
+            models.UniqueConstraint(
+                fields=['option'],
+                condition=models.Q(likert_value__isnull=True),
+                name='unique_tally_option_choice'
+            ),
+        ]
+
+
+class TermTally(models.Model):
+    # Fréquence d'un mot (n=1) ou d'un bigramme (n=2) dans les réponses libres d'une question, tenue à jour à chaque soumission
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='term_tallies')
+    n = models.PositiveSmallIntegerField()
+    term = models.CharField(max_length=101)  # Deux mots d'au plus 50 caractères
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['question', 'n', 'term'], name='unique_term_tally'),
+        ]
+        indexes = [
+            # Termes les plus fréquents d'une question
+            models.Index(fields=['question', 'n', '-count'], name='termtally_top'),
+        ]
+
+
+class ReportJob(models.Model):
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'En attente'),
+        (STATUS_RUNNING, 'En cours'),
+        (STATUS_DONE, 'Terminé'),
+        (STATUS_FAILED, 'Échec'),
+    ]
+    KIND_CHOICES = [('word', 'Word'), ('pdf', 'PDF')]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    fingerprint = models.CharField(max_length=64)  # Version des données au moment de la demande
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='report_jobs')
+    file_path = models.CharField(max_length=500, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['kind', 'fingerprint'], name='reportjob_kind_fingerprint'),
+            models.Index(fields=['status', 'created_at'], name='reportjob_status_created'),
+        ]
+        constraints = [
+            # Un seul job actif par rapport et par version des données
+            models.UniqueConstraint(
+                fields=['kind', 'fingerprint'],
+                condition=models.Q(status__in=['pending', 'running']),
+                name='unique_active_report_job'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.pk} ({self.status})"
@@ -0,0 +1,205 @@
+import io
+from collections import deque
+from itertools import islice
+from xml.sax.saxutils import escape
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen.canvas import Canvas
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from .likert import LIKERT_HEADERS
+
+# Styles partagés, construits une fois par processus : ils ne sont que lus pendant la mise en page
+STYLES = getSampleStyleSheet()
+ANSWERS_STYLE = ParagraphStyle('Answers', parent=STYLES['Normal'], fontSize=10, leading=12)
+
+STATS_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 14),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 1), (-1, -1), 12),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+])
+# Sept colonnes Likert : police réduite et largeurs fixes, le libellé de l'option passe à la ligne
+LIKERT_TABLE_STYLE = TableStyle([
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+    ('FONTSIZE', (0, 1), (-1, -1), 10),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+], parent=STATS_TABLE_STYLE)
+LIKERT_OPTION_STYLE = ParagraphStyle('LikertOption', parent=STYLES['Normal'], fontSize=10, leading=12)
+LIKERT_COL_WIDTHS = [134, 56, 54, 62, 48, 66, 48]
+# Réponses texte : tableau compact à une colonne, sans grille, une ligne par réponse
+ANSWERS_TABLE_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('LEADING', (0, 0), (-1, -1), 12),
+    ('TOPPADDING', (0, 0), (-1, -1), 1),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
+    ('LINEBELOW', (0, 0), (-1, -1), 0.25, colors.lightgrey),
+])
+TOC_TABLE_STYLE = TableStyle([
+    ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+    ('LINEBELOW', (0, 0), (-1, -1), 0.25, colors.lightgrey),
+])
+STATS_HEADERS = {
+    'likert': LIKERT_HEADERS,
+    'multiple_choice': ['Option', 'Nombre', 'Pourcentage'],
+}
+
+ANSWERS_PER_BLOCK = 50  # Réponses texte par tableau : des blocs courts restent rapides à découper entre deux pages
+ANSWERS_WIDTH = 468  # Largeur utile d'une page lettre avec les marges par défaut
+
+
+def markup(value):
+    # Les réponses sont du texte libre : tout balisage est neutralisé avant de passer par Paragraph
+    return escape(str(value)).replace('\n', '<br/>')
+
+
+class FlowableStream:
+    """Séquence paresseuse consommée par ReportLab : les flowables sont produits au fil des pages, pas à l'avance."""
+
+    LOOKAHEAD = 32  # Assez pour les enchaînements keepWithNext (titres suivis de leur contenu)
+
+    def __init__(self, flowables):
+        self._source = iter(flowables)
+        self._buffer = deque()
+
+    def _fill(self, count):
+        while len(self._buffer) < count:
+            flowable = next(self._source, None)
+            if flowable is None:
+                return
+            self._buffer.append(flowable)
+
+    def __len__(self):
+        # Taille de la fenêtre chargée : ReportLab ne s'en sert que pour regarder les flowables suivants
+        self._fill(self.LOOKAHEAD)
+        return len(self._buffer)
+
+    @staticmethod
+    def _head(index):
+        """Nombre d'éléments visés en tête de séquence ; ReportLab ne modifie la séquence qu'au début."""
+        if isinstance(index, slice) and index.start in (None, 0) and index.step is None:
+            return index.stop or 0
+        if index == 0:
+            return 1
+        raise IndexError(f"FlowableStream ne se modifie qu'en tête, pas en {index!r}")
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            if index.step is not None or (index.start or 0) < 0 or index.stop is None or index.stop < 0:
+                raise IndexError(f"Tranche non prise en charge : {index!r}")
+            self._fill(index.stop)
+            return list(islice(self._buffer, index.start, index.stop))
+        if index < 0:
+            raise IndexError(f"Indice négatif non pris en charge : {index}")
+        self._fill(index + 1)
+        return self._buffer[index]
+
+    def __delitem__(self, index):
+        count = self._head(index)
+        self._fill(count)
+        if count > len(self._buffer):
+            raise IndexError(index)
+        for _ in range(count):
+            self._buffer.popleft()
+
+    def __setitem__(self, index, flowables):
+        # Seule forme utilisée par ReportLab : flowables[0:0] = S, pour remettre en tête les morceaux d'un découpage
+        if not isinstance(index, slice) or self._head(index) != 0:
+            raise IndexError(f"Seule l'insertion en tête (flowables[0:0] = ...) est prise en charge, pas {index!r}")
+        self._buffer.extendleft(reversed(flowables))
+
+    def insert(self, index, flowable):
+        if index != 0:
+            raise IndexError(f"Seule l'insertion en tête est prise en charge, pas en {index}")
+        self._buffer.appendleft(flowable)
+
+
+def build_pdf(flowables):
+    """Met en page les flowables (liste ou générateur) et retourne le contenu du PDF."""
+    output = io.BytesIO()
+    SimpleDocTemplate(output, pagesize=letter).build(FlowableStream(flowables))
+    return output.getvalue()
+
+
+def stats_table(kind, rows):
+    if kind == 'likert':
+        rows = [[Paragraph(markup(row[0]), LIKERT_OPTION_STYLE)] + row[1:] for row in rows]
+        table = Table([STATS_HEADERS[kind]] + rows, colWidths=LIKERT_COL_WIDTHS)
+        table.setStyle(LIKERT_TABLE_STYLE)
+        return table
+    table = Table([STATS_HEADERS[kind]] + rows)
+    table.setStyle(STATS_TABLE_STYLE)
+    return table
+
+
+def answer_cell(response):
+    # Une chaîne courte est dessinée telle quelle ; seules les réponses longues sont mises en forme (et échappées)
+    if '\n' not in response and stringWidth(response, 'Helvetica', 10) <= ANSWERS_WIDTH - 12:
+        return response
+    return Paragraph(markup(response), ANSWERS_STYLE)
+
+
+def text_answers(responses):
+    for start in range(0, len(responses), ANSWERS_PER_BLOCK):
+        table = Table(
+            [[answer_cell(response)] for response in responses[start:start + ANSWERS_PER_BLOCK]],
+            # splitInRow : une réponse plus haute qu'une page se poursuit sur la suivante au lieu de faire échouer le rendu
+            colWidths=[ANSWERS_WIDTH], hAlign='LEFT', splitInRow=1,
+        )
+        table.setStyle(ANSWERS_TABLE_STYLE)
+        yield table
+
+
+def part_flowables(part):
+    """Flowables d'une partie du rapport (voir reports.pdf_parts), produits à la demande."""
+    if part['section'] is not None:
+        yield Paragraph(markup(part['section']), STYLES['Heading1'])
+        yield Spacer(1, 12)
+
+    for question in part['questions']:
+        title = question['text'] + (' (suite)' if question.get('continued') else '')
+        yield Paragraph(markup(title), STYLES['Heading2'])
+        yield Spacer(1, 12)
+
+        if question['type'] == 'text':
+            yield from text_answers(question['responses'])
+            yield Spacer(1, 6)
+        else:
+            yield stats_table(question['type'], question['rows'])
+            yield Spacer(1, 12)
+
+
+def cover_flowables(entries):
+    # Page de titre et sommaire : (nom de section, numéro de page)
+    yield Paragraph("Rapport des statistiques", STYLES['Title'])
+    yield Spacer(1, 12)
+    if entries:
+        yield Paragraph("Sommaire", STYLES['Heading1'])
+        table = Table([[Paragraph(markup(name), STYLES['Normal']), str(page)] for name, page in entries], colWidths=[400, 60])
+        table.setStyle(TOC_TABLE_STYLE)
+        yield table
+
+
+def page_numbers(total):
+    """PDF d'une page par numéro, à superposer aux pages du rapport assemblé."""
+    output = io.BytesIO()
+    canvas = Canvas(output, pagesize=letter)
+    width, _ = letter
+    for number in range(1, total + 1):
+        canvas.setFont('Helvetica', 9)
+        canvas.drawCentredString(width / 2, 30, f"Page {number} / {total}")
+        canvas.showPage()
+    canvas.save()
+    return output.getvalue()
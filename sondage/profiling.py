@@ -0,0 +1,231 @@
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.backends.django import Template
+
+logger = logging.getLogger(__name__)
+
+# Bornes supérieures (ms) des classes de l'histogramme de latence ; la dernière classe est ouverte
+LATENCY_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+METRICS = ('requests', 'total_us', 'db_us', 'template_us', 'python_us', 'queries')
+COUNTERS = METRICS + tuple(f'bucket_{index}' for index in range(len(LATENCY_BUCKETS) + 1))
+CACHE_PREFIX = 'sondage:profile'
+FLUSH_INTERVAL = 10  # secondes entre deux reports des compteurs locaux vers le cache partagé
+TOP_SHAPES = 5
+
+# Variable de contexte plutôt que thread-local : l'ORM async exécute les requêtes dans un autre thread
+_profile = ContextVar('sondage_profile', default=None)
+_lock = threading.Lock()
+_pending = defaultdict(Counter)
+_last_flush = time.monotonic()
+
+
+class RequestProfile:
+    __slots__ = ('queries', 'db_time', 'template_time', 'template_db_time', 'template_depth', 'shapes')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_db_time = 0.0
+        self.template_depth = 0
+        self.shapes = defaultdict(lambda: [0, 0.0])
+
+
+def sql_shape(sql):
+    # Même requête à des paramètres près : on replie les listes IN (%s, %s, ...) et les littéraux
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r'\b\d+\b', '?', sql)
+    return re.sub(r'\((?:%s|\?)(?:, (?:%s|\?))*\)', '(...)', sql)
+
+
+def _record_query(execute, sql, params, many, context):
+    profile = _profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        profile.queries += 1
+        profile.db_time += duration
+        if profile.template_depth:
+            profile.template_db_time += duration
+        shape = profile.shapes[sql_shape(sql)]
+        shape[0] += 1
+        shape[1] += duration
+
+
+_template_render = Template.render
+
+
+def install_query_wrapper(connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def _timed_render(self, context=None, request=None):
+    profile = _profile.get()
+    if profile is None:
+        return _template_render(self, context, request)
+    # Seul le rendu le plus externe est chronométré (les {% include %} sont déjà comptés)
+    profile.template_depth += 1
+    start = time.perf_counter()
+    try:
+        return _template_render(self, context, request)
+    finally:
+        profile.template_depth -= 1
+        if not profile.template_depth:
+            profile.template_time += time.perf_counter() - start
+
+
+def bucket_for(total_ms):
+    for index, bound in enumerate(LATENCY_BUCKETS):
+        if total_ms <= bound:
+            return index
+    return len(LATENCY_BUCKETS)
+
+
+def record(view_name, total, profile):
+    """Ajoute une requête aux compteurs locaux du processus, reportés périodiquement dans le cache."""
+    global _last_flush
+    template_time = max(profile.template_time - profile.template_db_time, 0.0)
+    stats = {
+        'requests': 1,
+        'total_us': int(total * 1e6),
+        'db_us': int(profile.db_time * 1e6),
+        'template_us': int(template_time * 1e6),
+        'python_us': int(max(total - profile.db_time - template_time, 0.0) * 1e6),
+        'queries': profile.queries,
+        f'bucket_{bucket_for(total * 1000)}': 1,
+    }
+    with _lock:
+        _pending[view_name].update(stats)
+        if time.monotonic() - _last_flush < FLUSH_INTERVAL:
+            return
+        pending = dict(_pending)
+        _pending.clear()
+        _last_flush = time.monotonic()
+    flush(pending)
+
+
+def flush(pending=None):
+    if pending is None:
+        with _lock:
+            pending = dict(_pending)
+            _pending.clear()
+    for view_name, stats in pending.items():
+        for name, value in stats.items():
+            key = f'{CACHE_PREFIX}:{view_name}:{name}'
+            # incr est atomique sur Redis/Memcached ; add initialise la clé au premier passage
+            if not cache.add(key, value, timeout=None):
+                try:
+                    cache.incr(key, value)
+                except ValueError:
+                    cache.set(key, value, timeout=None)
+
+
+def view_stats(view_names):
+    """Compteurs agrégés et histogramme de latence de chaque vue, tous processus confondus."""
+    flush()
+    keys = [f'{CACHE_PREFIX}:{view}:{name}' for view in view_names for name in COUNTERS]
+    values = cache.get_many(keys)
+
+    stats = {}
+    for view in view_names:
+        counters = {name: values.get(f'{CACHE_PREFIX}:{view}:{name}', 0) for name in COUNTERS}
+        requests = counters['requests']
+        if not requests:
+            continue
+        stats[view] = {
+            'requests': requests,
+            'mean_ms': round(counters['total_us'] / requests / 1000, 2),
+            'mean_db_ms': round(counters['db_us'] / requests / 1000, 2),
+            'mean_template_ms': round(counters['template_us'] / requests / 1000, 2),
+            'mean_python_ms': round(counters['python_us'] / requests / 1000, 2),
+            'mean_queries': round(counters['queries'] / requests, 2),
+            'histogram': [
+                {'le_ms': bound, 'count': counters[f'bucket_{index}']}
+                for index, bound in enumerate(LATENCY_BUCKETS + (None,))
+            ],
+        }
+    return stats
+
+
+def reset_stats(view_names):
+    with _lock:
+        _pending.clear()
+    cache.delete_many([f'{CACHE_PREFIX}:{view}:{name}' for view in view_names for name in COUNTERS])
+
+
+def log_slow_request(request, view_name, total, profile):
+    shapes = sorted(profile.shapes.items(), key=lambda item: (item[1][0], item[1][1]), reverse=True)[:TOP_SHAPES]
+    logger.warning(
+        "Requête lente %s %s (%s) : %.0f ms, %d requêtes SQL en %.0f ms, gabarits %.0f ms [pid %d]\n%s",
+        request.method, request.path, view_name, total * 1000, profile.queries, profile.db_time * 1000,
+        profile.template_time * 1000, os.getpid(),
+        '\n'.join(f'  {count}× {duration * 1000:.1f} ms  {shape}' for shape, (count, duration) in shapes),
+    )
+
+
+class ProfilingMiddleware:
+    """Mesure, pour chaque vue, le nombre de requêtes SQL et le temps passé en base, en gabarits et en Python."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_ms = getattr(settings, 'PROFILE_SLOW_REQUEST_MS', 500)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        # Chaque connexion, y compris celles ouvertes par les threads de l'ORM async, passe par _record_query
+        connection_created.connect(install_query_wrapper, dispatch_uid='sondage_profiling')
+        # Le temps de rendu est mesuré en enveloppant Template.render du moteur Django
+        if Template.render is not _timed_render:
+            Template.render = _timed_render
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        for connection in connections.all(initialized_only=True):
+            install_query_wrapper(connection)
+        profile = RequestProfile()
+        token = _profile.set(profile)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _profile.reset(token)
+        self.finish(request, time.perf_counter() - start, profile)
+        return response
+
+    async def __acall__(self, request):
+        profile = RequestProfile()
+        token = _profile.set(profile)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _profile.reset(token)
+        self.finish(request, time.perf_counter() - start, profile)
+        return response
+
+    def finish(self, request, total, profile):
+        # Les réponses en streaming sont produites après ce point : seule la préparation est mesurée
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match else 'unresolved'
+        record(view_name, total, profile)
+        if total * 1000 >= self.slow_ms:
+            log_slow_request(request, view_name, total, profile)
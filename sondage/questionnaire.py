@@ -0,0 +1,169 @@
+import json
+import os
+from dataclasses import dataclass, field
+
+from django.db import transaction
+
+from .models import Option, Question, ResponseOption, Section
+from .schema import schema_changed
+
+DEFAULT_DEFINITION = os.path.join(os.path.dirname(__file__), 'questionnaires', 'cofeda.json')
+QUESTION_TYPES = ('text', 'choice', 'likert')
+
+
+class DefinitionError(ValueError):
+    pass
+
+
+def read_definition(path=DEFAULT_DEFINITION):
+    """Lit et valide un questionnaire déclaratif (JSON) : sections, questions identifiées par leur numéro, options."""
+    try:
+        with open(path, encoding='utf-8') as definition_file:
+            definition = json.load(definition_file)
+    except (OSError, json.JSONDecodeError) as e:
+        raise DefinitionError(f"Lecture de {path} impossible : {e}")
+
+    sections = definition.get('sections') if isinstance(definition, dict) else None
+    if not isinstance(sections, list):
+        raise DefinitionError("Le questionnaire doit contenir une liste 'sections'.")
+    names, numbers = set(), set()
+    for section in sections:
+        if not section.get('name') or section['name'] in names:
+            raise DefinitionError(f"Nom de section absent ou en double : {section.get('name')!r}")
+        names.add(section['name'])
+        for question in section.get('questions', []):
+            number = question.get('number')
+            if not number or number in numbers or len(number) > Question._meta.get_field('number').max_length:
+                raise DefinitionError(f"Numéro de question absent, trop long ou en double : {number!r}")
+            numbers.add(number)
+            if question.get('type') not in QUESTION_TYPES or not question.get('text'):
+                raise DefinitionError(f"{number} : type ({', '.join(QUESTION_TYPES)}) et texte obligatoires.")
+            options = question.get('options', [])
+            if (question['type'] == 'text') != (not options):
+                raise DefinitionError(f"{number} : options obligatoires, sauf pour les questions texte.")
+            if len(set(options)) != len(options) or any(len(option) > Option._meta.get_field('text').max_length for option in options):
+                raise DefinitionError(f"{number} : options en double ou trop longues.")
+    return sections
+
+
+@dataclass
+class LoadResult:
+    created: list = field(default_factory=list)
+    updated: list = field(default_factory=list)
+    deleted: list = field(default_factory=list)
+    obsolete: list = field(default_factory=list)  # Absents de la définition mais conservés (réponses collectées, ou sans prune)
+
+    @property
+    def changed(self):
+        return bool(self.created or self.updated or self.deleted)
+
+
+def _answered(column, items):
+    # Éléments auxquels au moins une réponse fait référence, en une requête
+    if not items:
+        return set()
+    return set(ResponseOption.objects.filter(
+        **{f'{column}__in': [item.id for item in items]}
+    ).values_list(column, flat=True).distinct())
+
+
+def _flags(question_type):
+    return {'is_text': question_type == 'text', 'is_likert': question_type == 'likert'}
+
+
+@transaction.atomic
+def load_definition(sections, prune=False):
+    """Applique la définition par différence : quelques requêtes groupées, dans une seule transaction.
+
+    Les sections sont identifiées par leur nom, les questions par leur numéro et les options par leur texte.
+    Rien n'est supprimé sans `prune`, et jamais un élément qui a déjà des réponses ; changer le type d'une question
+    qui a des réponses est refusé (DefinitionError), ses réponses ne correspondraient plus à son type.
+    """
+    result = LoadResult()
+    existing_sections = {section.name: section for section in Section.objects.all()}
+    existing_questions = {question.number: question for question in Question.objects.all()}
+    existing_options = {}
+    for option in Option.objects.order_by('id'):
+        existing_options.setdefault(option.question_id, {})[option.text] = option
+
+    new_sections = [Section(name=section['name']) for section in sections if section['name'] not in existing_sections]
+    for section in Section.objects.bulk_create(new_sections):
+        existing_sections[section.name] = section
+        result.created.append(f"section {section.name}")
+
+    new_questions, changed_questions, retyped_questions = [], [], []
+    for section in sections:
+        section_id = existing_sections[section['name']].id
+        for question in section.get('questions', []):
+            values = {'section_id': section_id, 'text': question['text'], **_flags(question['type'])}
+            current = existing_questions.get(question['number'])
+            if current is None:
+                new_questions.append(Question(number=question['number'], **values))
+            elif any(getattr(current, name) != value for name, value in values.items()):
+                if any(getattr(current, name) != value for name, value in _flags(question['type']).items()):
+                    retyped_questions.append(current)
+                for name, value in values.items():
+                    setattr(current, name, value)
+                changed_questions.append(current)
+                result.updated.append(f"question {current.number}")
+    answered_retyped = _answered('question_id', retyped_questions)
+    if answered_retyped:
+        numbers = ', '.join(question.number for question in retyped_questions if question.id in answered_retyped)
+        raise DefinitionError(f"Type inchangeable, la question a déjà des réponses : {numbers}")
+    for question in Question.objects.bulk_create(new_questions):
+        existing_questions[question.number] = question
+        result.created.append(f"question {question.number}")
+    Question.objects.bulk_update(changed_questions, ['section', 'text', 'is_text', 'is_likert'], batch_size=500)
+
+    new_options = []
+    wanted_options = set()
+    for section in sections:
+        for question in section.get('questions', []):
+            question_id = existing_questions[question['number']].id
+            current = existing_options.get(question_id, {})
+            for text in question.get('options', []):
+                if text in current:
+                    wanted_options.add(current[text].id)
+                else:
+                    new_options.append(Option(question_id=question_id, text=text))
+                    result.created.append(f"option {question['number']} : {text}")
+    Option.objects.bulk_create(new_options, batch_size=500)
+
+    # Éléments absents de la définition : supprimés avec `prune` seulement s'ils n'ont aucune réponse
+    wanted_sections = {section['name'] for section in sections}
+    wanted_questions = {question['number'] for section in sections for question in section.get('questions', [])}
+    questions_by_id = {question.id: question for question in existing_questions.values()}
+    obsolete_questions = [question for number, question in existing_questions.items() if number not in wanted_questions]
+    obsolete_options = [
+        option for options in existing_options.values() for option in options.values()
+        if option.id not in wanted_options and questions_by_id[option.question_id].number in wanted_questions
+    ]
+    obsolete_sections = [section for name, section in existing_sections.items() if name not in wanted_sections]
+
+    answered_questions = _answered('question_id', obsolete_questions)
+    answered_options = _answered('option_id', obsolete_options)
+    deletable_questions = [question for question in obsolete_questions if question.id not in answered_questions]
+    deletable_options = [option for option in obsolete_options if option.id not in answered_options]
+    # Supprimer une section supprimerait ses questions : seules les sections vides à l'issue du chargement partent
+    remaining_sections = {question.section_id for question in existing_questions.values() if question not in deletable_questions}
+    deletable_sections = [section for section in obsolete_sections if section.id not in remaining_sections]
+
+    labels = {
+        'option': lambda option: f"option {questions_by_id[option.question_id].number} : {option.text}",
+        'question': lambda question: f"question {question.number}",
+        'section': lambda section: f"section {section.name}",
+    }
+    for kind, model, obsolete, deletable in (
+        ('option', Option, obsolete_options, deletable_options),
+        ('question', Question, obsolete_questions, deletable_questions),
+        ('section', Section, obsolete_sections, deletable_sections),
+    ):
+        if prune and deletable:
+            model.objects.filter(id__in=[item.id for item in deletable]).delete()
+            result.deleted += [labels[kind](item) for item in deletable]
+        result.obsolete += [labels[kind](item) for item in obsolete if not (prune and item in deletable)]
+
+    if result.changed:
+        # bulk_create et bulk_update n'émettent pas les signaux qui invalident le schéma
+        schema_changed()
+    return result
@@ -0,0 +1,155 @@
+import io
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from pypdf import PdfReader, PdfWriter
+
+from .likert import likert_row
+from .pdf import build_pdf, cover_flowables, page_numbers, part_flowables
+from .word import iter_docx
+
+REPORT_FORMATS = {
+    'word': ('docx', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'),
+    'pdf': ('pdf', 'application/pdf'),
+}
+
+
+def write_word_report(report_data, output):
+    for chunk in iter_docx(report_data):
+        output.write(chunk)
+
+
+# Au-delà de ce nombre de réponses texte, une question est découpée en plusieurs parties rendues en parallèle
+PART_MAX_ANSWERS = 1500
+# En dessous, le coût de transfert vers le pool dépasse le gain : rendu dans le processus courant
+PARALLEL_MIN_ANSWERS = 1000
+_pdf_pool = None
+_pdf_pool_lock = threading.Lock()
+
+
+def _pdf_processes():
+    return getattr(settings, 'REPORT_PDF_PROCESSES', 0) or os.cpu_count() or 1
+
+
+def pdf_pool():
+    """Pool de processus partagé ; « spawn » car les processus enfants n'ont besoin ni de Django ni de la base."""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            _pdf_pool = ProcessPoolExecutor(max_workers=_pdf_processes(), mp_context=multiprocessing.get_context('spawn'))
+        return _pdf_pool
+
+
+def pdf_parts(report_data, max_answers=None):
+    """Découpe le rapport en parties indépendantes : une par section, les longues questions texte en plusieurs morceaux.
+
+    Les réponses texte peuvent être des itérateurs (build_report(lazy_texts=True)) : elles sont lues partie par partie.
+    """
+    max_answers = max_answers or PART_MAX_ANSWERS
+    for section in report_data:
+        part = {'section': section['name'], 'questions': []}
+        size = 0
+        for question_data in section['questions']:
+            # Données simples uniquement : les parties sont transmises par pickle aux processus du pool
+            question = {'text': question_data['question'].text, 'type': question_data['type']}
+            if question_data['type'] == 'likert':
+                part['questions'].append({**question, 'rows': [
+                    likert_row(option_data) for option_data in question_data['options_data']
+                ]})
+                size += 1
+            elif question_data['type'] == 'multiple_choice':
+                part['questions'].append({**question, 'rows': [
+                    [r['option'], str(r['count']), f"{r['percentage']}%"] for r in question_data['responses']
+                ]})
+                size += 1
+            else:
+                responses = iter(question_data['responses'])
+                chunk, continued = list(islice(responses, max_answers)), False
+                while True:
+                    if size and size + len(chunk) > max_answers:
+                        yield part
+                        part = {'section': None, 'questions': []}
+                        size = 0
+                    part['questions'].append({**question, 'responses': chunk, 'continued': continued})
+                    size += len(chunk)
+                    chunk, continued = list(islice(responses, max_answers)), True
+                    if not chunk:
+                        break
+        yield part
+
+
+def part_answers(part):
+    return sum(len(question.get('responses', ())) for question in part['questions'])
+
+
+def render_pdf_part(part):
+    """Rend une partie du rapport en PDF autonome et retourne son contenu."""
+    return build_pdf(part_flowables(part))
+
+
+def render_pdf_parts(parts, processes):
+    """(partie, PDF rendu) dans l'ordre ; au plus 2 × processes parties, avec leurs réponses, en mémoire à la fois."""
+    pending = deque()
+    answers = 0
+    for part in parts:
+        # Sur place jusqu'au seuil : en dessous, le transfert vers le pool coûte plus qu'il ne rapporte
+        answers += part_answers(part)
+        if processes > 1 and answers >= PARALLEL_MIN_ANSWERS:
+            pending.append((part['section'], pdf_pool().submit(render_pdf_part, part)))
+            if len(pending) >= 2 * processes:
+                section, future = pending.popleft()
+                yield section, future.result()
+        else:
+            yield part['section'], render_pdf_part(part)
+    while pending:
+        section, future = pending.popleft()
+        yield section, future.result()
+
+
+def write_pdf_report(report_data, output, processes=None, toc=True):
+    """Rapport PDF : parties rendues au fil de la lecture (en parallèle au-delà du seuil), puis assemblées avec
+    sommaire et numérotation continue.
+
+    Les réponses ne sont jamais toutes en mémoire ; l'assemblage garde en revanche les pages rendues (taille du PDF).
+    """
+    processes = processes or _pdf_processes()
+    readers = []
+    # Page de début de chaque section, comptée dans le corps puis décalée de la longueur du sommaire
+    starts = []
+    page = 1
+    for section, content in render_pdf_parts(pdf_parts(report_data), processes):
+        reader = PdfReader(io.BytesIO(content))
+        readers.append(reader)
+        if section is not None:
+            starts.append((section, page))
+        page += len(reader.pages)
+
+    # Le sommaire tient en général sur la page de titre ; sinon on le refait avec le bon décalage
+    cover = PdfReader(io.BytesIO(build_pdf(cover_flowables([(name, start + 1) for name, start in starts] if toc else []))))
+    if len(cover.pages) > 1:
+        cover = PdfReader(io.BytesIO(build_pdf(cover_flowables([(name, start + len(cover.pages)) for name, start in starts]))))
+    offset = len(cover.pages)
+
+    writer = PdfWriter()
+    for reader in [cover] + readers:
+        for pdf_page in reader.pages:
+            writer.add_page(pdf_page)
+    for name, start in starts:
+        writer.add_outline_item(name, start + offset - 1)
+
+    numbers = PdfReader(io.BytesIO(page_numbers(len(writer.pages))))
+    for pdf_page, number_page in zip(writer.pages, numbers.pages):
+        pdf_page.merge_page(number_page)
+    writer.write(output)
+
+
+def write_report(kind, report_data, output):
+    if kind == 'word':
+        write_word_report(report_data, output)
+    else:
+        write_pdf_report(report_data, output)
@@ -0,0 +1,160 @@
+import hashlib
+import threading
+import time
+from dataclasses import dataclass
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Prefetch
+
+from .models import Option, Question, Section
+
+VERSION_CACHE_KEY = 'sondage:schema_version'
+
+
+@dataclass(frozen=True, slots=True)
+class OptionSchema:
+    id: int
+    question_id: int
+    text: str
+
+    def __str__(self):
+        return self.text
+
+
+@dataclass(frozen=True, slots=True)
+class QuestionSchema:
+    id: int
+    section_id: int
+    number: str
+    text: str
+    is_likert: bool
+    is_text: bool
+    options: tuple
+
+    def __str__(self):
+        return f"{self.number}: {self.text[:50]}..."
+
+
+@dataclass(frozen=True, slots=True)
+class SectionSchema:
+    id: int
+    name: str
+    questions: tuple
+
+    def __str__(self):
+        return self.name
+
+
+@dataclass(frozen=True, slots=True)
+class QuestionnaireSchema:
+    version: int
+    digest: str  # Empreinte du contenu : clé des caches qui doivent survivre à un changement de base
+    sections: tuple
+    questions: dict  # id -> QuestionSchema
+    options: dict  # id -> OptionSchema
+    fields: dict  # nom du champ du formulaire -> (QuestionSchema, OptionSchema ou None)
+
+
+def get_version(key=VERSION_CACHE_KEY):
+    version = cache.get(key)
+    if version is None:
+        # Première utilisation ou cache vidé : le premier worker qui pose la valeur l'emporte
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key, 0)
+    return version
+
+
+def bump_version(key=VERSION_CACHE_KEY):
+    cache.set(key, time.time_ns(), timeout=None)
+
+
+def version_changed(key=VERSION_CACHE_KEY):
+    # Invalidation immédiate puis à nouveau après le commit, pour qu'aucun worker ne garde une
+    # donnée lue avant la fin de la transaction sous le nouveau numéro de version
+    bump_version(key)
+    transaction.on_commit(lambda: bump_version(key))
+
+
+def schema_changed():
+    version_changed()
+
+
+def build_schema(version):
+    sections = []
+    questions = {}
+    options = {}
+    fields = {}
+    digest = hashlib.sha256()
+
+    # Ordre de création partout : les colonnes positionnelles de l'export (Q06.1, Q06.2...) restent stables
+    for section in Section.objects.order_by('id').prefetch_related(
+        Prefetch('questions', queryset=Question.objects.order_by('id')),
+        Prefetch('questions__options', queryset=Option.objects.order_by('id')),
+    ):
+        section_questions = []
+        for question in section.questions.all():
+            question_options = tuple(
+                OptionSchema(id=option.id, question_id=question.id, text=option.text)
+                for option in question.options.all()
+            )
+            question_schema = QuestionSchema(
+                id=question.id,
+                section_id=section.id,
+                number=question.number,
+                text=question.text,
+                is_likert=question.is_likert,
+                is_text=question.is_text,
+                options=question_options,
+            )
+            section_questions.append(question_schema)
+            questions[question.id] = question_schema
+
+            if question.is_likert:
+                for option in question_options:
+                    fields[f'question_{question.id}_{option.id}'] = (question_schema, option)
+            else:
+                fields[f'question_{question.id}'] = (question_schema, None)
+
+            for option in question_options:
+                options[option.id] = option
+            digest.update(repr((
+                question.id, question.number, question.text, question.is_likert, question.is_text,
+                [(option.id, option.text) for option in question_options],
+            )).encode())
+
+        sections.append(SectionSchema(id=section.id, name=section.name, questions=tuple(section_questions)))
+        digest.update(repr((section.id, section.name)).encode())
+
+    return QuestionnaireSchema(
+        version=version,
+        digest=digest.hexdigest()[:20],
+        sections=tuple(sections),
+        questions=questions,
+        options=options,
+        fields=fields,
+    )
+
+
+_schema = None
+_lock = threading.Lock()
+
+
+def get_schema():
+    """Structure du questionnaire, reconstruite seulement quand la version partagée change."""
+    global _schema
+    version = get_version()
+    schema = _schema
+    if schema is not None and schema.version == version:
+        return schema
+
+    with _lock:
+        if _schema is None or _schema.version != version:
+            _schema = build_schema(version)
+        return _schema
+
+
+async def aget_schema():
+    # Le cache et la reconstruction éventuelle sont bloquants : exécutés hors de la boucle d'événements
+    return await sync_to_async(get_schema)()
@@ -0,0 +1,93 @@
+import html
+import re
+
+from django.db import connection
+
+from .models import ResponseOption
+
+SEARCH_LIMIT = 50
+MAX_SEARCH_LIMIT = 200
+# Délimiteurs des termes trouvés dans l'extrait, remplacés par <mark> une fois le texte échappé
+MATCH_START, MATCH_END = '\x02', '\x03'
+
+POSTGRESQL_SEARCH = """
+    SELECT answer.id, answer.response_id, answer.question_id, answer.text_response,
+           ts_headline('french', answer.text_response, query, %s) AS highlight,
+           ts_rank(to_tsvector('french'::regconfig, COALESCE(answer.text_response, '')), query) AS rank
+    FROM sondage_responseoption AS answer, websearch_to_tsquery('french', %s) AS query
+    -- Même expression et même condition que l'index GIN responseopt_text_search
+    WHERE answer.text_response IS NOT NULL
+      AND to_tsvector('french'::regconfig, COALESCE(answer.text_response, '')) @@ query
+      AND answer.question_id IN ({question_ids})
+    ORDER BY rank DESC, answer.id
+    LIMIT %s
+"""
+
+SQLITE_SEARCH = """
+    SELECT answer.id, answer.response_id, answer.question_id, answer.text_response,
+           snippet(sondage_text_search, 0, %s, %s, '…', 16) AS highlight,
+           -bm25(sondage_text_search) AS rank
+    FROM sondage_text_search
+    JOIN sondage_responseoption AS answer ON answer.id = sondage_text_search.rowid
+    WHERE sondage_text_search MATCH %s
+      AND answer.question_id IN ({question_ids})
+    ORDER BY bm25(sondage_text_search), answer.id
+    LIMIT %s
+"""
+
+
+class SearchError(ValueError):
+    pass
+
+
+def _terms(query):
+    return re.findall(r'\w+', query)
+
+
+def _highlight(text):
+    return html.escape(text).replace(MATCH_START, '<mark>').replace(MATCH_END, '</mark>')
+
+
+def _search_rows(query, question_ids, limit):
+    if connection.vendor == 'postgresql':
+        sql, params = POSTGRESQL_SEARCH, [f'StartSel={MATCH_START}, StopSel={MATCH_END}, MaxFragments=2', query]
+    elif connection.vendor == 'sqlite':
+        # Chaque mot entre guillemets, en préfixe : la syntaxe FTS5 saisie par l'utilisateur n'est jamais interprétée
+        sql = SQLITE_SEARCH
+        params = [MATCH_START, MATCH_END, ' '.join(f'"{term}"*' for term in _terms(query))]
+    else:
+        # Autres moteurs : recherche non indexée, sans classement
+        answers = ResponseOption.objects.filter(text_response__icontains=query, question_id__in=question_ids)
+        return [(*row, row[3], 0.0) for row in answers.order_by('id').values_list(
+            'id', 'response_id', 'question_id', 'text_response'
+        )[:limit]]
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql.format(question_ids=', '.join(['%s'] * len(question_ids))), [*params, *question_ids, limit])
+        return cursor.fetchall()
+
+
+def search_answers(schema, query, number=None, limit=SEARCH_LIMIT):
+    """Réponses texte correspondant à `query`, les plus pertinentes d'abord, avec un extrait surligné (HTML échappé)."""
+    query = query.strip()
+    if not _terms(query):
+        raise SearchError("Saisissez au moins un mot à rechercher.")
+    questions = [question for question in schema.questions.values() if question.is_text]
+    if number:
+        questions = [question for question in questions if question.number == number]
+        if not questions:
+            raise SearchError(f"Question texte inconnue : {number}")
+    if not questions:
+        return []
+    limit = max(1, min(limit, MAX_SEARCH_LIMIT))
+
+    rows = _search_rows(query, [question.id for question in questions], limit)
+    numbers = {question.id: question.number for question in questions}
+    return [{
+        'id': answer_id,
+        'response_id': response_id,
+        'question': numbers[question_id],
+        'text': text,
+        'highlight': _highlight(highlight or text),
+        'rank': round(rank, 4),
+    } for answer_id, response_id, question_id, text, highlight, rank in rows]
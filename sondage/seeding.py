@@ -0,0 +1,89 @@
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .likert import LIKERT_SCALE
+from .models import Response, ResponseOption
+from .schema import get_schema
+from .tallies import rebuild_tallies
+from .terms import rebuild_terms
+
+FIRST_NAMES = ['Awa', 'Moussa', 'Fatimé', 'Mahamat', 'Achta', 'Abakar', 'Hawa', 'Idriss', 'Zara', 'Brahim']
+LAST_NAMES = ['Ranebaye', 'Djimet', 'Ngaradoum', 'Mahamat', 'Abdelkerim', 'Nodjigoto', 'Haroun', 'Allamine']
+PROFESSIONS = ['Enseignant', 'Ingénieure agronome', 'Commerçant', 'Infirmière', 'Comptable', 'Étudiant', 'Entrepreneur', 'Animatrice communautaire']
+# Distribution Likert légèrement décalée vers le haut de l'échelle, comme dans les vraies réponses
+LIKERT_WEIGHTS = [5, 8, 14, 25, 28, 20]
+
+
+def random_answers(schema, rng):
+    """Réponses aléatoires mais plausibles à tout le questionnaire, sous forme de ResponseOption non enregistrées."""
+    answers = []
+    for section in schema.sections:
+        for question in section.questions:
+            if question.is_text:
+                if 'Prénom' in question.text:
+                    text = rng.choice(FIRST_NAMES)
+                elif 'Profession' in question.text:
+                    text = rng.choice(PROFESSIONS)
+                else:
+                    text = rng.choice(LAST_NAMES)
+                answers.append(ResponseOption(question_id=question.id, text_response=text))
+            elif question.is_likert:
+                bias = rng.choice([-1, 0, 0, 1])
+                for option in question.options:
+                    value = rng.choices(LIKERT_SCALE, weights=LIKERT_WEIGHTS)[0] + bias
+                    value = min(max(value, LIKERT_SCALE[0]), LIKERT_SCALE[-1])
+                    answers.append(ResponseOption(question_id=question.id, option_id=option.id, likert_value=value))
+            elif question.options:
+                option = rng.choice(question.options)
+                answers.append(ResponseOption(question_id=question.id, option_id=option.id))
+    return answers
+
+
+def random_form_data(schema, rng):
+    # Mêmes réponses, sous la forme d'un POST du formulaire
+    data = {}
+    for answer in random_answers(schema, rng):
+        question = schema.questions[answer.question_id]
+        if question.is_text:
+            data[f'question_{question.id}'] = answer.text_response
+        elif question.is_likert:
+            data[f'question_{question.id}_{answer.option_id}'] = str(answer.likert_value)
+        else:
+            data[f'question_{question.id}'] = str(answer.option_id)
+    return data
+
+
+@transaction.atomic
+def seed_responses(users, responses, batch_size=500, seed=None, password='sondage'):
+    """Crée `users` utilisateurs et `responses` réponses aléatoires par insertions groupées, puis recalcule les compteurs."""
+    schema = get_schema()
+    rng = random.Random(seed)
+
+    start = User.objects.filter(username__startswith='seed_').count()
+    password_hash = make_password(password)  # Un seul hachage pour tous les comptes
+    created_users = User.objects.bulk_create([
+        User(username=f'seed_{start + i}', first_name=rng.choice(FIRST_NAMES), last_name=rng.choice(LAST_NAMES), password=password_hash)
+        for i in range(users)
+    ], batch_size=batch_size)
+    user_ids = [user.pk for user in created_users] or list(User.objects.values_list('pk', flat=True)[:1000])
+    if not user_ids:
+        raise ValueError("Aucun utilisateur disponible pour rattacher les réponses.")
+
+    for offset in range(0, responses, batch_size):
+        batch = Response.objects.bulk_create([
+            Response(user_id=rng.choice(user_ids))
+            for _ in range(min(batch_size, responses - offset))
+        ])
+        answers = []
+        for response in batch:
+            for answer in random_answers(schema, rng):
+                answer.response_id = response.pk
+                answers.append(answer)
+        ResponseOption.objects.bulk_create(answers, batch_size=batch_size * 10)
+
+    rebuild_tallies()
+    rebuild_terms()
+    return len(created_users), responses
@@ -0,0 +1,48 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Option, Question, ResponseOption, Section
+from .schema import schema_changed
+from .tallies import decrement_tally
+from .terms import decrement_terms, increment_terms, term_counts
+
+
+@receiver([post_save, post_delete], sender=Section)
+@receiver([post_save, post_delete], sender=Question)
+@receiver([post_save, post_delete], sender=Option)
+def invalidate_schema(sender, **kwargs):
+    schema_changed()
+
+
+@receiver(post_delete, sender=ResponseOption)
+def remove_from_tally(sender, instance, **kwargs):
+    # Réponse supprimée seule ou en cascade (soumission, utilisateur) : les statistiques et leur ETag suivent.
+    # Une suppression en SQL brut échappe au signal : planifier `rebuild_tallies --check` pour la détecter.
+    if instance.option_id is not None:
+        decrement_tally(instance.option_id, instance.likert_value)
+
+
+@receiver(post_delete, sender=ResponseOption)
+def remove_from_terms(sender, instance, **kwargs):
+    # Réponse texte supprimée : ses mots (noms compris) quittent le nuage de mots
+    if instance.text_response:
+        decrement_terms(term_counts([(instance.question_id, instance.text_response)]))
+
+
+@receiver(pre_save, sender=ResponseOption)
+def remember_text(sender, instance, raw=False, **kwargs):
+    # Réponse existante modifiée (admin) : texte précédent lu avant l'écriture, pour corriger les fréquences
+    if instance.pk is not None and not raw:
+        instance._previous_text = ResponseOption.objects.filter(pk=instance.pk).values_list(
+            'question_id', 'text_response'
+        ).first()
+
+
+@receiver(post_save, sender=ResponseOption)
+def update_terms(sender, instance, created, raw=False, **kwargs):
+    previous = getattr(instance, '_previous_text', None)
+    current = (instance.question_id, instance.text_response)
+    if created or raw or previous is None or previous == current:
+        return
+    decrement_terms(term_counts([previous]))
+    increment_terms(term_counts([current]))
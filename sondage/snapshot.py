@@ -0,0 +1,249 @@
+import json
+import os
+import shutil
+import time
+from dataclasses import dataclass
+
+import numpy as np
+from django.conf import settings
+from django.db.models.functions import Coalesce
+
+from .models import Response, ResponseOption
+from .schema import get_schema
+
+SNAPSHOT_FORMAT = 1
+MANIFEST = 'manifest.json'
+BATCH_SIZE = 20000  # Réponses ajoutées à l'instantané par lot
+MISSING = -1
+
+# Une valeur par réponse : id de l'option choisie, valeur Likert, ou fin du texte dans le blob de la question
+IDS_FILE = 'response_ids.i8'
+ID_DTYPE = np.int64
+CHOICE_DTYPE = np.int32
+LIKERT_DTYPE = np.int8
+OFFSET_DTYPE = np.int64
+
+
+def choice_file(question_id):
+    return f'q{question_id}.i4'
+
+
+def likert_file(question_id, option_id):
+    return f'q{question_id}_{option_id}.i1'
+
+
+def text_files(question_id):
+    # Offsets de fin (un par réponse) et textes UTF-8 concaténés
+    return f'q{question_id}.off', f'q{question_id}.txt'
+
+
+def column_files(schema):
+    """Fichiers à largeur fixe de l'instantané : nom -> (type NumPy, question, option Likert ou None)."""
+    files = {IDS_FILE: (ID_DTYPE, None, None)}
+    for question in schema.questions.values():
+        if question.is_text:
+            files[text_files(question.id)[0]] = (OFFSET_DTYPE, question, None)
+        elif question.is_likert:
+            for option in question.options:
+                files[likert_file(question.id, option.id)] = (LIKERT_DTYPE, question, option)
+        else:
+            files[choice_file(question.id)] = (CHOICE_DTYPE, question, None)
+    return files
+
+
+@dataclass(frozen=True, slots=True)
+class Snapshot:
+    """Instantané en colonnes des réponses, lu sans copie via numpy.memmap."""
+
+    path: str  # Répertoire de la génération courante
+    digest: str  # Empreinte du questionnaire au moment de l'export
+    last_id: int
+    rows: int
+
+    def array(self, name, dtype):
+        if not self.rows:
+            return np.empty(0, dtype=dtype)
+        # Les octets au-delà de `rows` (ajout interrompu) ne sont jamais lus
+        return np.memmap(os.path.join(self.path, name), dtype=dtype, mode='r', shape=(self.rows,))
+
+    def response_ids(self):
+        return self.array(IDS_FILE, ID_DTYPE)
+
+    def choice(self, question_id):
+        return self.array(choice_file(question_id), CHOICE_DTYPE)
+
+    def likert(self, question_id, option_id):
+        return self.array(likert_file(question_id, option_id), LIKERT_DTYPE)
+
+    def texts(self, question_id):
+        offsets_name, blob_name = text_files(question_id)
+        ends = self.array(offsets_name, OFFSET_DTYPE)
+        size = int(ends[-1]) if self.rows else 0
+        blob = np.memmap(os.path.join(self.path, blob_name), dtype=np.uint8, mode='r', shape=(size,)) if size else b''
+        start = 0
+        for end in ends.tolist():
+            yield bytes(blob[start:end]).decode('utf-8')
+            start = end
+
+
+def _read_manifest(root):
+    try:
+        with open(os.path.join(root, MANIFEST)) as manifest:
+            data = json.load(manifest)
+    except FileNotFoundError:
+        return None
+    return data if data.get('format') == SNAPSHOT_FORMAT else None
+
+
+def _write_manifest(root, generation, digest, last_id, rows):
+    tmp_path = os.path.join(root, f'{MANIFEST}.{os.getpid()}.tmp')
+    with open(tmp_path, 'w') as manifest:
+        json.dump({'format': SNAPSHOT_FORMAT, 'generation': generation, 'digest': digest,
+                   'last_id': last_id, 'rows': rows}, manifest)
+        manifest.flush()
+        os.fsync(manifest.fileno())
+    # Remplacement atomique : un lecteur voit l'ancien ou le nouvel état, jamais un manifeste partiel
+    os.replace(tmp_path, os.path.join(root, MANIFEST))
+
+
+def open_snapshot(root=None):
+    """Instantané courant, ou None s'il n'a jamais été produit."""
+    root = root or settings.SNAPSHOT_ROOT
+    manifest = _read_manifest(root)
+    if manifest is None:
+        return None
+    return Snapshot(
+        path=os.path.join(root, manifest['generation']),
+        digest=manifest['digest'],
+        last_id=manifest['last_id'],
+        rows=manifest['rows'],
+    )
+
+
+def is_current(snapshot, schema):
+    # Même questionnaire, et aucune réponse apparue (transaction plus lente) ou supprimée sous le dernier id exporté
+    return (
+        snapshot is not None
+        and snapshot.digest == schema.digest
+        and Response.objects.filter(id__lte=snapshot.last_id).count() == snapshot.rows
+    )
+
+
+def _truncate(snapshot, schema):
+    # Reprise après un ajout interrompu : chaque fichier est ramené à l'état décrit par le manifeste
+    text_ends = {}
+    for name, (dtype, question, _) in column_files(schema).items():
+        with open(os.path.join(snapshot.path, name), 'ab') as output:
+            output.truncate(snapshot.rows * np.dtype(dtype).itemsize)
+        if question is not None and question.is_text:
+            offsets = snapshot.array(name, dtype)
+            text_ends[question.id] = int(offsets[-1]) if len(offsets) else 0
+            with open(os.path.join(snapshot.path, text_files(question.id)[1]), 'ab') as output:
+                output.truncate(text_ends[question.id])
+    return text_ends
+
+
+def _option_lookup(schema, files):
+    # Tables indexées par id d'option : colonne de destination et nature (Likert ou choix)
+    names = list(files)
+    size = max(schema.options, default=0) + 1
+    column = np.full(size, MISSING, dtype=np.int32)
+    likert = np.zeros(size, dtype=bool)
+    for index, (_, question, option) in enumerate(files.values()):
+        if question is None or question.is_text:
+            continue
+        for question_option in ([option] if question.is_likert else question.options):
+            column[question_option.id] = index
+            likert[question_option.id] = question.is_likert
+    return names, column, likert
+
+
+def _batch_columns(schema, files, response_ids):
+    """Valeurs de chaque colonne pour un lot de réponses consécutives, en deux requêtes."""
+    first_id, last_id = int(response_ids[0]), int(response_ids[-1])
+    names, option_column, option_likert = _option_lookup(schema, files)
+    values = np.full((len(names), len(response_ids)), MISSING, dtype=np.int64)
+
+    answers = np.array(ResponseOption.objects.filter(
+        response_id__gte=first_id, response_id__lte=last_id, option__isnull=False
+    ).annotate(value=Coalesce('likert_value', MISSING)).values_list(
+        'response_id', 'option_id', 'value'
+    ), dtype=np.int64).reshape(-1, 3)
+    response_id, option_id, likert_value = answers.T
+    # Options créées après la lecture du questionnaire : ignorées jusqu'à la prochaine génération
+    known = option_id < len(option_column)
+    response_id, option_id, likert_value = response_id[known], option_id[known], likert_value[known]
+    column = option_column[option_id]
+    selected = column != MISSING
+    row = np.searchsorted(response_ids, response_id)
+    values[column[selected], row[selected]] = np.where(option_likert[option_id], likert_value, option_id)[selected]
+
+    columns = {name: values[index].astype(files[name][0]) for index, name in enumerate(names)}
+    columns[IDS_FILE] = response_ids
+
+    texts = {question.id: [b''] * len(response_ids) for _, question, _ in files.values() if question and question.is_text}
+    rows = {response_id: row for row, response_id in enumerate(response_ids.tolist())}
+    for response_id, question_id, text_response in ResponseOption.objects.filter(
+        response_id__gte=first_id, response_id__lte=last_id, question_id__in=list(texts)
+    ).values_list('response_id', 'question_id', 'text_response'):
+        if text_response:
+            texts[question_id][rows[response_id]] = text_response.encode('utf-8')
+    return columns, texts
+
+
+def write_snapshot(root=None, full=False, batch_size=BATCH_SIZE):
+    """Complète l'instantané avec les réponses postérieures au dernier id exporté ; retourne (ajoutées, total)."""
+    root = root or settings.SNAPSHOT_ROOT
+    os.makedirs(root, exist_ok=True)
+    schema = get_schema()
+    files = column_files(schema)
+    snapshot = open_snapshot(root)
+    new_generation = full or not is_current(snapshot, schema)
+
+    if not new_generation:
+        generation = os.path.basename(snapshot.path)
+        text_ends = _truncate(snapshot, schema)
+        last_id, rows = snapshot.last_id, snapshot.rows
+    else:
+        # Nouvelle génération : les lecteurs de l'ancienne la gardent jusqu'au changement de manifeste
+        generation = f'{schema.digest}-{time.time_ns()}'
+        os.makedirs(os.path.join(root, generation))
+        for _, question, _ in files.values():
+            if question is not None and question.is_text:
+                open(os.path.join(root, generation, text_files(question.id)[1]), 'wb').close()
+        for name in files:
+            open(os.path.join(root, generation, name), 'wb').close()
+        text_ends = {question.id: 0 for question in schema.questions.values() if question.is_text}
+        last_id, rows = 0, 0
+
+    path = os.path.join(root, generation)
+    appended = 0
+    while True:
+        response_ids = np.array(
+            Response.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size],
+            dtype=ID_DTYPE,
+        )
+        if not len(response_ids):
+            break
+        columns, texts = _batch_columns(schema, files, response_ids)
+        for question_id, values in texts.items():
+            offsets_name, blob_name = text_files(question_id)
+            columns[offsets_name] = text_ends[question_id] + np.cumsum([len(value) for value in values], dtype=OFFSET_DTYPE)
+            with open(os.path.join(path, blob_name), 'ab') as output:
+                output.write(b''.join(values))
+            text_ends[question_id] = int(columns[offsets_name][-1])
+        for name, values in columns.items():
+            with open(os.path.join(path, name), 'ab') as output:
+                output.write(values.tobytes())
+
+        last_id = int(response_ids[-1])
+        rows += len(response_ids)
+        appended += len(response_ids)
+        # Le manifeste n'avance qu'une fois le lot écrit : un arrêt en cours de lot est repris au lancement suivant
+        _write_manifest(root, generation, schema.digest, last_id, rows)
+
+    if new_generation:
+        _write_manifest(root, generation, schema.digest, last_id, rows)
+        if snapshot is not None:
+            shutil.rmtree(snapshot.path, ignore_errors=True)
+    return appended, rows
@@ -0,0 +1,86 @@
+import uuid
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+
+from .likert import LIKERT_SCALE
+from .models import Response, ResponseOption
+from .tallies import increment_tallies
+from .terms import increment_terms, term_counts
+
+
+class SubmissionError(Exception):
+    pass
+
+
+def parse_submission(schema, data):
+    """Valide tout le POST en mémoire et retourne les ResponseOption à enregistrer (sans réponse associée)."""
+    answers = []
+    for field_name, (question, option) in schema.fields.items():
+        if field_name not in data:
+            continue
+        value = data.get(field_name)
+
+        if question.is_text:
+            answers.append(ResponseOption(question_id=question.id, text_response=value))
+        elif question.is_likert:
+            try:
+                likert_value = int(value)
+            except (TypeError, ValueError):
+                likert_value = None
+            if likert_value not in LIKERT_SCALE:
+                raise SubmissionError(f"Valeur invalide pour la question {question.number}")
+            answers.append(ResponseOption(question_id=question.id, option_id=option.id, likert_value=likert_value))
+        else:
+            option = schema.options.get(int(value)) if value.isdigit() else None
+            if option is None or option.question_id != question.id:
+                raise SubmissionError(f"Option invalide pour la question {question.number}")
+            answers.append(ResponseOption(question_id=question.id, option_id=option.id))
+    return answers
+
+
+def submission_token(data):
+    """Jeton généré par le formulaire (un renvoi garde le même) ; un nouveau jeton s'il est absent ou invalide."""
+    try:
+        return uuid.UUID(data.get('submission_token', ''))
+    except ValueError:
+        return uuid.uuid4()
+
+
+def user_token(token, user_id):
+    """Jeton de repli, propre à l'utilisateur, quand le jeton reçu est déjà pris par un autre : stable d'un renvoi à l'autre."""
+    return uuid.uuid5(uuid.UUID(str(token)), str(user_id))
+
+
+def _create_response(user, token):
+    # Insertion d'abord, lecture sur conflit : deux envois simultanés du même jeton ne créent qu'une réponse
+    for candidate in (token, user_token(token, user.pk)):
+        try:
+            with transaction.atomic():
+                return Response.objects.create(user=user, submission_token=candidate), True
+        except IntegrityError:
+            existing = Response.objects.get(submission_token=candidate)
+            if existing.user_id == user.pk:
+                return existing, False
+    raise SubmissionError("Jeton de soumission invalide.")
+
+
+@transaction.atomic
+def save_submission(user, answers, token=None):
+    # Une réponse, un bulk_create et une mise à jour des compteurs, quelle que soit la taille du questionnaire
+    if token is None:
+        response = Response.objects.create(user=user)
+    else:
+        response, created = _create_response(user, token)
+        if not created:
+            return response
+    for answer in answers:
+        answer.response = response
+    ResponseOption.objects.bulk_create(answers)
+    increment_tallies(Counter(
+        (answer.question_id, answer.option_id, answer.likert_value)
+        for answer in answers
+        if answer.option_id is not None
+    ))
+    increment_terms(term_counts((answer.question_id, answer.text_response) for answer in answers))
+    return response
@@ -0,0 +1,94 @@
+from collections import Counter, defaultdict
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from .models import OptionTally, ResponseOption
+from .schema import get_version, version_changed
+
+# Numéro de version des compteurs, changé à chaque écriture : sert d'ETag aux statistiques
+TALLIES_VERSION_KEY = 'sondage:tallies_version'
+
+
+def tallies_version():
+    return get_version(TALLIES_VERSION_KEY)
+
+
+def _key_filter(keys):
+    return reduce(or_, (Q(option_id=option_id, likert_value=likert_value) for _, option_id, likert_value in keys))
+
+
+def increment_tallies(increments):
+    """Ajoute `increments` ({(question_id, option_id, likert_value): n}) aux compteurs, à appeler dans la transaction de soumission."""
+    # Une seule requête UPDATE par incrément distinct (toujours 1 pour une soumission individuelle)
+    by_amount = defaultdict(list)
+    for key, amount in increments.items():
+        if amount:
+            by_amount[amount].append(key)
+    if by_amount:
+        version_changed(TALLIES_VERSION_KEY)
+
+    for amount, keys in by_amount.items():
+        updated = OptionTally.objects.filter(_key_filter(keys)).update(count=F('count') + amount)
+        if updated == len(keys):
+            continue
+
+        # Première réponse pour certaines options : on crée les lignes manquantes puis on les incrémente
+        existing = set(OptionTally.objects.filter(_key_filter(keys)).values_list('option_id', 'likert_value'))
+        missing = [key for key in keys if (key[1], key[2]) not in existing]
+        OptionTally.objects.bulk_create([
+            OptionTally(question_id=question_id, option_id=option_id, likert_value=likert_value)
+            for question_id, option_id, likert_value in missing
+        ], ignore_conflicts=True)
+        OptionTally.objects.filter(_key_filter(missing)).update(count=F('count') + amount)
+
+
+def decrement_tally(option_id, likert_value):
+    """Retire une réponse supprimée de son compteur, dans la transaction de suppression (voir signals)."""
+    OptionTally.objects.filter(option_id=option_id, likert_value=likert_value, count__gt=0).update(count=F('count') - 1)
+    version_changed(TALLIES_VERSION_KEY)
+
+
+def tallies_queryset():
+    # GROUP BY question, option, likert_value : couvert par l'index responseopt_q_opt_likert
+    return ResponseOption.objects.filter(option__isnull=False).values(
+        'question_id', 'option_id', 'likert_value'
+    ).annotate(count=Count('id')).order_by()
+
+
+def compute_tallies():
+    # Recalcul complet depuis la table des réponses
+    rows = tallies_queryset()
+    return Counter({
+        (row['question_id'], row['option_id'], row['likert_value']): row['count']
+        for row in rows
+    })
+
+
+def stored_tallies():
+    rows = OptionTally.objects.filter(count__gt=0).values_list('question_id', 'option_id', 'likert_value', 'count')
+    return Counter({(question_id, option_id, likert_value): count for question_id, option_id, likert_value, count in rows})
+
+
+def find_drift():
+    """Liste des clés dont le compteur stocké diffère du recalcul : [(clé, stocké, attendu)]."""
+    expected = compute_tallies()
+    stored = stored_tallies()
+    return sorted(
+        ((key, stored[key], expected[key]) for key in set(expected) | set(stored) if stored[key] != expected[key]),
+        key=lambda item: (item[0][0], item[0][1], -1 if item[0][2] is None else item[0][2])
+    )
+
+
+@transaction.atomic
+def rebuild_tallies():
+    tallies = compute_tallies()
+    OptionTally.objects.all().delete()
+    OptionTally.objects.bulk_create([
+        OptionTally(question_id=question_id, option_id=option_id, likert_value=likert_value, count=count)
+        for (question_id, option_id, likert_value), count in tallies.items()
+    ], batch_size=500)
+    version_changed(TALLIES_VERSION_KEY)
+    return len(tallies)
@@ -0,0 +1,122 @@
+import re
+import unicodedata
+from collections import Counter
+
+from django.db import connection, transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from .models import ResponseOption, TermTally
+from .schema import get_schema, get_version, version_changed
+
+MAX_TERM_LENGTH = 50
+TOP_TERMS = 20
+# Numéro de version des fréquences, changé à chaque écriture : sert d'ETag au nuage de mots
+TERMS_VERSION_KEY = 'sondage:terms_version'
+# Termes par requête d'incrément : 4 paramètres chacun, sous la limite de 999 paramètres des anciens SQLite
+TERMS_PER_QUERY = 200
+# Mots vides du français, sous leur forme normalisée (minuscules, sans accents)
+STOP_WORDS = frozenset('''
+    a ai aie au aussi autre autres aux avec avoir c ca car ce cela ces cet cette ceux chez comme d dans de des donc
+    du elle elles en encore entre est et etc etaient etait ete etre eu eux il ils j je l la le les leur leurs lui m
+    ma mais me meme mes moi mon n ne ni nos notre nous on ont ou par pas peu plus pour qu quand que quel quelle qui
+    s sa sans se ses si son sont sous sur t ta te tes toi ton tous tout toute toutes tres tu un une vers vos votre
+    vous y
+'''.split())
+
+UPSERT = (
+    'INSERT INTO {table} (question_id, n, term, count) VALUES {rows} '
+    'ON CONFLICT (question_id, n, term) DO UPDATE SET count = {table}.count + excluded.count'
+)
+DECREMENT = 'UPDATE {table} SET count = count - %s WHERE question_id = %s AND n = %s AND term = %s'
+
+
+def fold(text):
+    # Minuscules et accents retirés : « Élève » et « eleve » comptent pour le même mot
+    decomposed = unicodedata.normalize('NFKD', text.casefold())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def tokenize(text):
+    return [
+        word for word in re.findall(r'[^\W_]+', fold(text))
+        if word not in STOP_WORDS and not word.isdigit() and len(word) <= MAX_TERM_LENGTH
+    ]
+
+
+def term_counts(answers):
+    """Occurrences de chaque mot et bigramme : {(question_id, n, terme): nombre} pour des (question_id, texte)."""
+    counts = Counter()
+    for question_id, text in answers:
+        if not text:
+            continue
+        words = tokenize(text)
+        counts.update((question_id, 1, word) for word in words)
+        counts.update((question_id, 2, f'{first} {second}') for first, second in zip(words, words[1:]))
+    return counts
+
+
+def increment_terms(increments):
+    """Ajoute `increments` aux fréquences stockées, à appeler dans la transaction d'écriture.
+
+    Un INSERT multi-lignes par tranche de TERMS_PER_QUERY termes : une seule requête pour une soumission.
+    """
+    rows = [(question_id, n, term, count) for (question_id, n, term), count in increments.items()]
+    if not rows:
+        return
+    table = connection.ops.quote_name(TermTally._meta.db_table)
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), TERMS_PER_QUERY):
+            chunk = rows[start:start + TERMS_PER_QUERY]
+            cursor.execute(
+                UPSERT.format(table=table, rows=', '.join(['(%s, %s, %s, %s)'] * len(chunk))),
+                [value for row in chunk for value in row],
+            )
+    version_changed(TERMS_VERSION_KEY)
+
+
+def decrement_terms(decrements):
+    """Retire des fréquences les termes d'une réponse supprimée ou modifiée (voir signals) ; les termes à zéro disparaissent."""
+    rows = [(count, question_id, n, term) for (question_id, n, term), count in decrements.items()]
+    if not rows:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(DECREMENT.format(table=connection.ops.quote_name(TermTally._meta.db_table)), rows)
+    TermTally.objects.filter(question_id__in={row[1] for row in rows}, count__lte=0).delete()
+    version_changed(TERMS_VERSION_KEY)
+
+
+def compute_terms():
+    # Recalcul complet depuis les réponses texte
+    answers = ResponseOption.objects.filter(text_response__isnull=False).values_list('question_id', 'text_response')
+    return term_counts(answers.iterator(chunk_size=2000))
+
+
+@transaction.atomic
+def rebuild_terms():
+    terms = compute_terms()
+    TermTally.objects.all().delete()
+    TermTally.objects.bulk_create([
+        TermTally(question_id=question_id, n=n, term=term, count=count)
+        for (question_id, n, term), count in terms.items()
+    ], batch_size=500)
+    version_changed(TERMS_VERSION_KEY)
+    return len(terms)
+
+
+def terms_version():
+    # Change à chaque écriture des fréquences (soumission, import, suppression, reconstruction) ou du questionnaire
+    return f"{get_schema().digest}-{get_version(TERMS_VERSION_KEY)}"
+
+
+def top_terms(questions, limit=TOP_TERMS):
+    """Mots et bigrammes les plus fréquents de chaque question texte, en une requête (fenêtre par question et n)."""
+    rows = TermTally.objects.filter(question_id__in=[question.id for question in questions], count__gt=0).annotate(
+        position=Window(RowNumber(), partition_by=[F('question_id'), F('n')], order_by=[F('count').desc(), F('term')])
+    ).filter(position__lte=limit).order_by('question_id', 'n', 'position').values_list('question_id', 'n', 'term', 'count')
+
+    data = {question.id: {'id': question.id, 'number': question.number, 'text': question.text, 'terms': [], 'bigrams': []}
+            for question in questions}
+    for question_id, n, term, count in rows:
+        data[question_id]['terms' if n == 1 else 'bigrams'].append({'term': term, 'count': count})
+    return [data[question.id] for question in questions]
@@ -1,3 +1,868 @@
-from django.test import TestCase
+import copy
+import csv
+import io
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+import uuid
+import zipfile
+from collections import Counter
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from pypdf import PdfReader
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.platypus import Paragraph, SimpleDocTemplate
+
+from .aggregation import build_report, data_version
+from .artifacts import evict_artifacts, find_artifact, store_artifact
+from .benchmark import ENDPOINTS, run_benchmark
+from .crosstab import _columns, _load_rows, crosstab_data, load_matrix
+from .exports import iter_export
+from .ingestion import IMPORT_FORMATS, IngestionError, ingest
+from .jobs import claim_job, enqueue_report, run_job
+from . import journal
+from .journal import append_submission, flush_submissions, pending_submissions
+from .likert import LikertStats
+from .pdf import STYLES, FlowableStream, build_pdf, part_flowables
+from .models import Option, Question, ReportJob, Response, ResponseOption, TermTally
+from .profiling import reset_stats, sql_shape
+from .reports import pdf_parts, pdf_pool, write_pdf_report
+from .questionnaire import DefinitionError, load_definition, read_definition
+from .schema import bump_version, get_schema
+from .seeding import random_form_data, seed_responses
+from .snapshot import open_snapshot, write_snapshot
+from .submission import parse_submission, save_submission, user_token
+from .tallies import find_drift
+from .terms import increment_terms, rebuild_terms, term_counts, tokenize
+from .word import run, table_row
+
+TEST_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'sondage-tests'}}
+
+
+# Pas de génération de rapport en arrière-plan pendant les tests : les jobs restent en attente
+@override_settings(CACHES=TEST_CACHES, REPORT_RENDER_WORKERS=0)
+class QuestionnaireTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('populate_questionnaire', stdout=io.StringIO())
+
+    def setUp(self):
+        # Le schéma est mémorisé par processus : on l'invalide entre deux classes de tests
+        bump_version()
+        # Artefacts de rapport et instantané dans un répertoire jetable
+        files_root = tempfile.TemporaryDirectory()
+        self.addCleanup(files_root.cleanup)
+        settings_override = self.settings(
+            REPORTS_ROOT=os.path.join(files_root.name, 'reports'),
+            SNAPSHOT_ROOT=os.path.join(files_root.name, 'snapshot'),
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+class SeedingTests(QuestionnaireTestCase):
+    def test_seed_creates_consistent_responses(self):
+        users, responses = seed_responses(3, 25, batch_size=10, seed=1)
+        self.assertEqual((users, responses), (3, 25))
+        self.assertEqual(Response.objects.count(), 25)
+        self.assertEqual(ResponseOption.objects.values('response_id').distinct().count(), 25)
+        self.assertEqual(find_drift(), [])
+
+    def test_deleted_answers_leave_the_tallies(self):
+        seed_responses(3, 25, seed=24)
+        self.client.force_login(User.objects.create_user('tally_admin', is_staff=True))
+        etag = self.client.get(reverse('sondage:api_stats'))['ETag']
+
+        Response.objects.order_by('id').first().delete()
+        ResponseOption.objects.filter(option__isnull=False).order_by('id').first().delete()
+        User.objects.filter(responses__isnull=False).first().delete()
+        self.assertEqual(find_drift(), [])
+        response = self.client.get(reverse('sondage:api_stats'), headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_stats_etag_changes_when_a_deletion_is_offset_by_a_submission(self):
+        seed_responses(2, 20, seed=25)
+        user = User.objects.create_user('offset_admin', is_staff=True)
+        self.client.force_login(user)
+        etag = self.client.get(reverse('sondage:api_stats'))['ETag']
+
+        # Mêmes réponses renvoyées : lignes, dernier id et total des compteurs identiques, seules les données ont changé
+        deleted = Response.objects.order_by('id').first()
+        answers = [
+            ResponseOption(question_id=answer.question_id, option_id=answer.option_id,
+                           likert_value=answer.likert_value, text_response=answer.text_response)
+            for answer in deleted.selected_options.all()
+        ]
+        deleted.delete()
+        save_submission(user, answers, uuid.uuid4())
+        response = self.client.get(reverse('sondage:api_stats'), headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class BenchmarkTests(QuestionnaireTestCase):
+    def test_benchmark_reports_every_endpoint(self):
+        results = run_benchmark([0, 10], requests=2, warmup=0)
+        self.assertEqual([size['size'] for size in results['sizes']], [0, 10])
+        for size in results['sizes']:
+            self.assertEqual(set(size['endpoints']), set(ENDPOINTS))
+            for measurement in size['endpoints'].values():
+                self.assertGreater(measurement['requests_per_second'], 0)
+                self.assertLessEqual(measurement['p50_ms'], measurement['p99_ms'])
+
+
+class QueryBudgetTests(QuestionnaireTestCase):
+    # Nombre maximal de requêtes SQL par vue, session et utilisateur compris ; il ne doit pas dépendre du volume
+    QUERY_BUDGETS = {
+        'survey_form': 4,
+        'admin_stats': 5,
+        'api_stats': 5,
+        'api_question_stats': 5,
+        'api_crosstab': 6,  # Matrice rechargée (3 requêtes) après la soumission de l'itération précédente
+        'admin_text_answers': 5,
+        'admin_export_responses': 6,
+        'admin_stats_word': 8,
+        'submit_survey': 12,
+    }
+    SIZES = (5, 60)
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user('budget_admin', password='pw', is_staff=True)
+        self.client.force_login(self.admin)
+
+    def request(self, name):
+        schema = get_schema()
+        if name == 'submit_survey':
+            return self.client.post(reverse('sondage:submit_survey'), random_form_data(schema, random.Random(0)))
+        if name == 'api_crosstab':
+            return self.client.get(reverse('sondage:api_crosstab'), {'question': 'Q06', 'by': 'Q01'})
+        if name == 'api_question_stats':
+            return self.client.get(reverse('sondage:api_question_stats', args=['Q06']))
+        if name == 'admin_text_answers':
+            question = next(question for question in schema.questions.values() if question.is_text)
+            return self.client.get(reverse('sondage:admin_text_answers', args=[question.id]))
+        return self.client.get(reverse(f'sondage:{name}'))
+
+    def count_queries(self, name):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.request(name)
+            self.assertEqual(response.status_code, 200, name)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        return len(captured.captured_queries)
+
+    def test_query_budgets_hold_at_every_size(self):
+        counts = {}
+        for size in self.SIZES:
+            seed_responses(2, size - Response.objects.count(), seed=size)
+            # Premier appel hors mesure : compteurs et artefacts initialisés, comme en production
+            for name in self.QUERY_BUDGETS:
+                self.request(name)
+            counts[size] = {name: self.count_queries(name) for name in self.QUERY_BUDGETS}
+
+        for name, budget in self.QUERY_BUDGETS.items():
+            with self.subTest(view=name):
+                self.assertLessEqual(counts[self.SIZES[-1]][name], budget)
+                self.assertEqual(counts[self.SIZES[0]][name], counts[self.SIZES[-1]][name])
+
+
+class ProfilingTests(QuestionnaireTestCase):
+    def test_sql_shape_folds_parameters(self):
+        self.assertEqual(
+            sql_shape("SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'x' LIMIT 21"),
+            "SELECT * FROM t WHERE id IN (...) AND name = ? LIMIT ?",
+        )
+
+    def test_middleware_records_view_stats(self):
+        admin = User.objects.create_user('profile_admin', password='pw', is_staff=True)
+        self.client.force_login(admin)
+        reset_stats(['sondage:admin_stats'])
+        for _ in range(3):
+            self.client.get(reverse('sondage:admin_stats'))
+
+        stats = self.client.get(reverse('sondage:admin_profile')).json()['views']['sondage:admin_stats']
+        self.assertEqual(stats['requests'], 3)
+        self.assertGreater(stats['mean_queries'], 0)
+        self.assertGreater(stats['mean_template_ms'], 0)
+        self.assertEqual(sum(bucket['count'] for bucket in stats['histogram']), 3)
+
+
+class SurveyFormCacheTests(QuestionnaireTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_user('respondent'))
+        # Premier affichage : établit le cookie CSRF dont dépend l'ETag
+        self.client.get(reverse('sondage:survey_form'))
+        self.etag = self.client.get(reverse('sondage:survey_form'))['ETag']
+
+    def revalidate(self):
+        return self.client.get(reverse('sondage:survey_form'), headers={'if-none-match': self.etag})
+
+    def test_unchanged_form_revalidates(self):
+        self.assertEqual(self.revalidate().status_code, 304)
+
+    def test_pending_messages_get_a_full_page(self):
+        field_name = next(name for name, (question, _) in get_schema().fields.items() if question.is_likert)
+        self.client.post(reverse('sondage:submit_survey'), {field_name: '99'})
+        response = self.revalidate()
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Valeur invalide pour la question')
+        self.assertEqual(self.revalidate().status_code, 304)
+
+    def test_schema_change_gets_a_full_page(self):
+        question = Question.objects.get(number='Q01')
+        question.text = 'Sexe'
+        question.save()
+        response = self.revalidate()
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Sexe')
+        self.assertNotEqual(response['ETag'], self.etag)
+
+
+class AsyncViewTests(QuestionnaireTestCase):
+    def setUp(self):
+        super().setUp()
+        seed_responses(2, 12, seed=3)
+        self.async_client.force_login(User.objects.create_user('async_admin', is_staff=True))
+
+    async def test_api_stats_revalidates_with_etag(self):
+        response = await self.async_client.get(reverse('sondage:api_stats'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['questions']), 16)
+
+        cached = await self.async_client.get(reverse('sondage:api_stats'), headers={'if-none-match': response['ETag']})
+        self.assertEqual(cached.status_code, 304)
+
+    async def test_asgi_export_matches_sync_export(self):
+        url = reverse('sondage:admin_export_responses') + '?format=ndjson&layout=answers'
+        response = await self.async_client.get(url)
+        streamed = b''.join([chunk async for chunk in response.streaming_content])
+        expected = ''.join(await sync_to_async(lambda: list(iter_export(get_schema(), 'ndjson', 'answers')))())
+        self.assertEqual(streamed.decode(), expected)
+
+    async def test_report_request_queues_a_job(self):
+        response = await self.async_client.get(reverse('sondage:admin_stats_pdf'))
+        self.assertEqual(response.status_code, 200)
+        job = await ReportJob.objects.aget(kind='pdf')
+        self.assertEqual(job.status, ReportJob.STATUS_PENDING)
+
+
+class LikertStatsTests(QuestionnaireTestCase):
+    def test_statistics_from_histogram(self):
+        values = [0, 1, 3, 3, 4, 5, 5, 2]
+        stats = LikertStats()
+        for value in values:
+            stats.add(value)
+        self.assertEqual(stats.histogram.tolist(), [1, 1, 1, 2, 1, 2])
+        self.assertAlmostEqual(stats.mean, statistics.mean(values))
+        self.assertEqual(stats.median, statistics.median(values))
+        self.assertAlmostEqual(stats.std_dev, statistics.stdev(values))
+        self.assertEqual(stats.top2_box, 37.5)
+        low, high = stats.confidence_interval
+        self.assertAlmostEqual((low + high) / 2, stats.mean)
+
+    def test_histograms_merge(self):
+        merged = LikertStats.from_counts({0: 2, 5: 1}) + LikertStats.from_counts({5: 3, None: 4})
+        self.assertEqual(merged, LikertStats([2, 0, 0, 0, 0, 4]))
+        self.assertIsNone(LikertStats().summary()['mean'])
+
+    def test_api_and_report_share_statistics(self):
+        seed_responses(2, 20, seed=5)
+        self.client.force_login(User.objects.create_user('likert_admin', is_staff=True))
+        question = self.client.get(reverse('sondage:api_question_stats', args=['Q06'])).json()['question']
+        report_question = next(
+            question_data for section in build_report() for question_data in section['questions']
+            if question_data['question'].number == 'Q06'
+        )
+        for option, option_data in zip(question['options'], report_question['options_data']):
+            self.assertEqual({key: option[key] for key in ('histogram', 'mean', 'median', 'std_dev', 'ci95')},
+                             {key: option_data[key] for key in ('histogram', 'mean', 'median', 'std_dev', 'ci95')})
+
+
+class CrosstabTests(QuestionnaireTestCase):
+    def setUp(self):
+        super().setUp()
+        seed_responses(3, 40, seed=6)
+        self.client.force_login(User.objects.create_user('crosstab_admin', is_staff=True))
+
+    def test_counts_match_database(self):
+        age = next(question for question in get_schema().questions.values() if question.number == 'Q02')
+        data = crosstab_data('Q02', 'Q01', [f'Q02:{age.options[0].id},{age.options[1].id}'])
+        for segment in data['segments']:
+            respondents = Response.objects.filter(selected_options__option_id=segment['id'])
+            for option in segment['options']:
+                expected = respondents.filter(selected_options__option_id=option['id']).count()
+                self.assertEqual(option['count'], expected if option['id'] in data['filters']['Q02'] else 0)
+
+    def test_likert_segments_sum_to_overall_histogram(self):
+        data = self.client.get(reverse('sondage:api_crosstab'), {'question': 'Q06', 'by': 'Q01'}).json()
+        overall = self.client.get(reverse('sondage:api_question_stats', args=['Q06'])).json()['question']
+        for index, option in enumerate(overall['options']):
+            histograms = [segment['options'][index]['histogram'] for segment in data['segments']]
+            self.assertEqual([sum(values) for values in zip(*histograms)], option['histogram'])
+
+    def test_invalid_requests_are_rejected(self):
+        url = reverse('sondage:api_crosstab')
+        self.assertEqual(self.client.get(url, {'question': 'Q06'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'question': 'Q01', 'by': 'Q06'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'question': 'Q99', 'by': 'Q01'}).status_code, 400)
+
+
+class SnapshotTests(QuestionnaireTestCase):
+    def assertMatrixMatchesDatabase(self):
+        schema = get_schema()
+        matrix = load_matrix(schema, 'test')
+        rows, expected = _load_rows(schema, _columns(schema), 0, Response.objects.count() + 1000)
+        self.assertEqual(matrix.rows, rows)
+        for key, values in expected.items():
+            self.assertEqual(matrix.columns[key].tolist(), values.tolist(), key)
+
+    def test_snapshot_is_extended_incrementally(self):
+        seed_responses(2, 30, seed=7)
+        self.assertEqual(write_snapshot(batch_size=8), (30, 30))
+        self.assertEqual(write_snapshot(), (0, 30))
+        seed_responses(1, 5, seed=8)
+        # Réponses postérieures à l'instantané : lues en base et ajoutées aux colonnes des fichiers
+        self.assertMatrixMatchesDatabase()
+        self.assertEqual(write_snapshot(), (5, 35))
+        self.assertMatrixMatchesDatabase()
+
+        snapshot = open_snapshot()
+        question = next(question for question in get_schema().questions.values() if question.is_text)
+        expected = ResponseOption.objects.filter(question_id=question.id).order_by('response_id')
+        self.assertEqual(list(snapshot.texts(question.id)), [text or '' for text in expected.values_list('text_response', flat=True)])
+        self.assertEqual(snapshot.response_ids().tolist(), list(Response.objects.order_by('id').values_list('id', flat=True)))
+
+    def test_interrupted_append_and_missing_rows_are_recovered(self):
+        seed_responses(2, 10, seed=9)
+        write_snapshot()
+        snapshot = open_snapshot()
+        # Lot à moitié écrit avant un arrêt : ignoré par les lecteurs, tronqué au lancement suivant
+        with open(os.path.join(snapshot.path, 'response_ids.i8'), 'ab') as output:
+            output.write(b'\xff' * 12)
+        seed_responses(1, 3, seed=10)
+        self.assertEqual(write_snapshot(), (3, 13))
+        self.assertMatrixMatchesDatabase()
+
+        # Réponse supprimée sous le dernier id exporté : nouvelle génération complète
+        Response.objects.order_by('id').first().delete()
+        self.assertEqual(write_snapshot(), (12, 12))
+        self.assertNotEqual(open_snapshot().path, snapshot.path)
+        self.assertFalse(os.path.exists(snapshot.path))
+
+
+class QuestionnaireLoaderTests(QuestionnaireTestCase):
+    def test_reloading_unchanged_definition_is_a_no_op(self):
+        with CaptureQueriesContext(connection) as captured:
+            result = load_definition(read_definition())
+        self.assertFalse(result.changed)
+        self.assertLessEqual(len(captured.captured_queries), 6)
+
+    def test_changes_are_applied_without_losing_answers(self):
+        seed_responses(2, 20, seed=11)
+        answers = ResponseOption.objects.count()
+        sections = copy.deepcopy(read_definition())
+        questions = {question['number']: question for section in sections for question in section['questions']}
+        questions['Q01']['text'] = 'Sexe'
+        questions['Q02']['options'].append('Plus de 65 ans')
+        removed_option = questions['Q03']['options'].pop(0)
+        Option.objects.create(question=Question.objects.get(number='Q03'), text='Option jamais choisie')
+        sections[-1]['questions'] = [question for question in sections[-1]['questions'] if question['number'] != 'Q13']
+
+        result = load_definition(sections, prune=True)
+        self.assertEqual(result.updated, ['question Q01'])
+        self.assertEqual(result.created, ['option Q02 : Plus de 65 ans'])
+        self.assertEqual(result.deleted, ['option Q03 : Option jamais choisie'])
+        self.assertEqual(result.obsolete, [f'option Q03 : {removed_option}', 'question Q13'])
+        self.assertEqual(ResponseOption.objects.count(), answers)
+
+        schema = get_schema()
+        question = next(question for question in schema.questions.values() if question.number == 'Q01')
+        self.assertEqual(question.text, 'Sexe')
+
+    def test_type_change_is_refused_once_answered(self):
+        sections = copy.deepcopy(read_definition())
+        questions = {question['number']: question for section in sections for question in section['questions']}
+        questions['Q06']['type'] = 'choice'
+        self.assertEqual(load_definition(copy.deepcopy(sections)).updated, ['question Q06'])
+        questions['Q06']['type'] = 'likert'
+        load_definition(copy.deepcopy(sections))
+
+        seed_responses(1, 5, seed=12)
+        questions['Q06']['type'] = 'choice'
+        questions['Q01']['text'] = 'Sexe'
+        with self.assertRaisesMessage(DefinitionError, 'Q06'):
+            load_definition(sections)
+        question = Question.objects.get(number='Q06')
+        self.assertTrue(question.is_likert)
+        self.assertNotEqual(Question.objects.get(number='Q01').text, 'Sexe')
+
+
+class WordStreamingTests(QuestionnaireTestCase):
+    def setUp(self):
+        super().setUp()
+        seed_responses(2, 30, seed=4)
+        self.client.force_login(User.objects.create_user('word_admin', is_staff=True))
+
+    def test_word_report_streams_and_fills_artifact_cache(self):
+        response = self.client.get(reverse('sondage:admin_stats_word'))
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content)
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            self.assertIsNone(archive.testzip())
+            document = archive.read('word/document.xml').decode()
+        self.assertIn('Rapport des statistiques', document)
+        self.assertIn('TableGrid', document)
+        self.assertEqual(ReportJob.objects.count(), 0)
+
+        path = find_artifact('word', data_version())
+        self.assertIsNotNone(path)
+        cached = self.client.get(reverse('sondage:admin_stats_word'))
+        self.assertEqual(b''.join(cached.streaming_content), content)
+
+    def test_missing_values_render_as_empty_cells(self):
+        self.assertEqual(run(None), '')
+        self.assertEqual(table_row([None, 0, 'Oui']).count('None'), 0)
+        self.assertIn('>0<', run(0))
+
+    def test_report_changed_during_render_is_not_cached(self):
+        version = data_version()
+        response = self.client.get(reverse('sondage:admin_stats_word'))
+        chunks = iter(response.streaming_content)
+        next(chunks)
+        seed_responses(1, 1, seed=19)
+        b''.join(chunks)
+        self.assertIsNone(find_artifact('word', version))
+        self.assertIsNone(find_artifact('word', data_version()))
+
+
+class ArtifactCacheTests(QuestionnaireTestCase):
+    def setUp(self):
+        super().setUp()
+        seed_responses(1, 5, seed=23)
+        self.client.force_login(User.objects.create_user('artifact_admin', is_staff=True))
+
+    def store(self, name, size=100, age=0):
+        path = store_artifact('pdf', name, lambda output: output.write(b'%' * size))
+        os.utime(path, (time.time() - age, time.time() - age))
+        return path
+
+    def test_cached_report_revalidates_with_etag(self):
+        store_artifact('pdf', data_version(), lambda output: output.write(b'%PDF-1.4 rapport'))
+        response = self.client.get(reverse('sondage:admin_stats_pdf'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF-1.4 rapport')
+
+        cached = self.client.get(reverse('sondage:admin_stats_pdf'), headers={'if-none-match': response['ETag']})
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached['ETag'], response['ETag'])
+        self.assertEqual(ReportJob.objects.count(), 0)
+
+    def test_old_artifacts_are_evicted(self):
+        old, recent = self.store('ancien', age=7200), self.store('récent', age=60)
+        self.assertEqual(evict_artifacts(max_age=3600, max_bytes=10 ** 6), [old])
+        self.assertFalse(os.path.exists(old))
+        self.assertTrue(os.path.exists(recent))
+
+    def test_least_recently_used_artifacts_are_evicted_over_size(self):
+        oldest, middle, newest = (self.store(name, age=age) for name, age in (('a', 30), ('b', 20), ('c', 10)))
+        self.assertEqual(evict_artifacts(max_age=3600, max_bytes=250), [oldest])
+        # L'artefact que l'on vient de produire est gardé même s'il est le plus ancien
+        self.assertEqual(evict_artifacts(keep=middle, max_age=3600, max_bytes=150), [newest])
+        self.assertTrue(os.path.exists(middle))
+
+
+class ReportJobTests(QuestionnaireTestCase):
+    def setUp(self):
+        super().setUp()
+        seed_responses(2, 10, seed=20)
+
+    def run_word_job(self):
+        job = enqueue_report('word')
+        self.assertTrue(claim_job(job))
+        return run_job(job)
+
+    def test_artifact_is_stored_under_rendered_version(self):
+        job = self.run_word_job()
+        self.assertEqual(job.status, ReportJob.STATUS_DONE)
+        self.assertEqual(find_artifact('word', job.fingerprint), job.file_path)
+
+    def test_artifact_rendered_from_changed_data_stays_out_of_cache(self):
+        def build_and_submit(**kwargs):
+            report = build_report(**kwargs)
+            seed_responses(1, 1, seed=21)
+            return report
+
+        with mock.patch('sondage.jobs.build_report', side_effect=build_and_submit):
+            job = self.run_word_job()
+        self.assertEqual(job.status, ReportJob.STATUS_DONE)
+        self.assertTrue(os.path.exists(job.file_path))
+        self.assertIsNone(find_artifact('word', job.fingerprint))
+        self.assertIsNone(find_artifact('word', data_version()))
+
+    def test_concurrent_request_finished_before_lookup(self):
+        # Job concurrent dont le fichier n'existe pas encore à la première lecture : il se termine pendant notre insertion
+        file_path = os.path.join(self.enterContext(tempfile.TemporaryDirectory()), 'rapport.pdf')
+        ReportJob.objects.create(kind='pdf', fingerprint=data_version(), status=ReportJob.STATUS_DONE, file_path=file_path)
+
+        def finish_elsewhere_then_conflict(**kwargs):
+            with open(file_path, 'wb') as output:
+                output.write(b'%PDF')
+            raise IntegrityError('unique_active_report_job')
+
+        self.client.force_login(User.objects.create_user('race_admin', is_staff=True))
+        with mock.patch.object(ReportJob.objects, 'create', side_effect=finish_elsewhere_then_conflict):
+            response = self.client.get(reverse('sondage:admin_stats_pdf'))
+        job = ReportJob.objects.get()
+        self.assertEqual(job.status, ReportJob.STATUS_DONE)
+        self.assertRedirects(response, reverse('sondage:report_job_download', args=[job.pk]), fetch_redirect_response=False)
+
+
+class PdfReportTests(QuestionnaireTestCase):
+    def setUp(self):
+        super().setUp()
+        seed_responses(2, 40, seed=22)
+
+    def pdf_text(self, report_data, **kwargs):
+        output = io.BytesIO()
+        write_pdf_report(report_data, output, processes=1, **kwargs)
+        return [page.extract_text() for page in PdfReader(io.BytesIO(output.getvalue())).pages]
+
+    def test_parts_read_text_answers_lazily(self):
+        read = []
+
+        def answers():
+            for number in range(25):
+                read.append(number)
+                yield f'Réponse {number}'
+
+        question = Question.objects.filter(is_text=True).first()
+        report_data = [{'name': 'Section', 'questions': [{'question': question, 'type': 'text', 'responses': answers()}]}]
+        parts = pdf_parts(report_data, max_answers=10)
+        first = next(parts)
+        self.assertEqual(len(first['questions'][0]['responses']), 10)
+        self.assertFalse(first['questions'][0]['continued'])
+        self.assertLessEqual(len(read), 20)
+        rest = list(parts)
+        self.assertEqual([len(part['questions'][0]['responses']) for part in rest], [10, 5])
+        self.assertTrue(all(part['questions'][0]['continued'] for part in rest))
+
+    def pages(self, content):
+        return [page.extract_text() for page in PdfReader(io.BytesIO(content)).pages]
+
+    def assert_stream_matches_list(self, flowables):
+        """Même mise en page depuis le flux paresseux que depuis une liste ; retourne le texte des pages."""
+        output = io.BytesIO()
+        SimpleDocTemplate(output, pagesize=letter).build(list(flowables()))
+        streamed = self.pages(build_pdf(flowables()))
+        self.assertEqual(streamed, self.pages(output.getvalue()))
+        return streamed
+
+    def test_long_text_answers_split_across_pages(self):
+        responses = ['Réponse courte', ' '.join(f'mot{number}' for number in range(3000))]
+        responses += [f'Réponse numéro {number}' for number in range(150)]
+        part = {'section': 'Section', 'questions': [
+            {'text': 'Libre', 'type': 'text', 'responses': responses, 'continued': False},
+        ]}
+        pages = self.assert_stream_matches_list(lambda: part_flowables(part))
+        self.assertGreater(len(pages), 3)
+        text = ' '.join(pages)
+        self.assertIn('mot0', text)
+        self.assertIn('mot2999', text)
+        self.assertIn('Réponse numéro 149', text)
+
+    def test_headings_stay_with_their_content(self):
+        heading = ParagraphStyle('Heading', parent=STYLES['Heading2'], keepWithNext=1)
+
+        def flowables():
+            for number in range(40):
+                yield Paragraph(f'Titre {number}', heading)
+                yield Paragraph(f'Corps {number} ' + 'texte ' * (20 * (number % 7)), STYLES['Normal'])
+
+        pages = self.assert_stream_matches_list(flowables)
+        self.assertGreater(len(pages), 1)
+        for number in range(40):
+            lines = next(lines for lines in map(str.splitlines, pages) if f'Titre {number}' in lines)
+            following = lines[lines.index(f'Titre {number}') + 1:]
+            self.assertTrue(following and following[0].split()[:2] == ['Corps', str(number)])
+
+    def test_flowable_stream_only_changes_its_head(self):
+        stream = FlowableStream(iter(['a', 'b', 'c']))
+        stream[0:0] = ['x', 'y']
+        stream.insert(0, 'w')
+        self.assertEqual(stream[:4], ['w', 'x', 'y', 'a'])
+        del stream[:2]
+        del stream[0]
+        self.assertEqual(stream[0], 'a')
+        for change in (lambda: stream.insert(1, 'z'), lambda: stream.__setitem__(slice(1, 1), ['z']),
+                       lambda: stream.__setitem__(0, 'z'), lambda: stream.__delitem__(1)):
+            with self.assertRaises(IndexError):
+                change()
+        self.assertEqual(stream[:5], ['a', 'b', 'c'])
+
+    def test_parallel_rendering_matches_sequential(self):
+        report_data = build_report()
+        with mock.patch('sondage.reports.PART_MAX_ANSWERS', 15), mock.patch('sondage.reports.PARALLEL_MIN_ANSWERS', 20):
+            sequential = io.BytesIO()
+            write_pdf_report(report_data, sequential, processes=1)
+            parallel = io.BytesIO()
+            with mock.patch('sondage.reports.pdf_pool', side_effect=pdf_pool) as pool:
+                write_pdf_report(report_data, parallel, processes=2)
+        self.assertTrue(pool.called)
+
+        reader = PdfReader(io.BytesIO(parallel.getvalue()))
+        pages = [page.extract_text() for page in reader.pages]
+        self.assertEqual(pages, self.pages(sequential.getvalue()))
+        for number, text in enumerate(pages, start=1):
+            self.assertIn(f'Page {number} / {len(pages)}', text)
+
+        sections = [section['name'] for section in report_data]
+        self.assertEqual([item.title for item in reader.outline], sections)
+        # Titres longs repliés sur plusieurs lignes : on compare les mots
+        words = [' '.join(text.split()) for text in pages]
+        for item in reader.outline:
+            number = reader.get_destination_page_number(item)
+            self.assertTrue(words[number].startswith(item.title), words[number][:80])
+            # Le sommaire de la page de titre renvoie à la même page
+            self.assertIn(f'{item.title} {number + 1} ', words[0])
+
+    def test_lazy_report_matches_loaded_report(self):
+        with mock.patch('sondage.reports.PART_MAX_ANSWERS', 15):
+            lazy = self.pdf_text(build_report(lazy_texts=True))
+            loaded = self.pdf_text(build_report())
+        self.assertEqual(lazy, loaded)
+
+
+class IngestionTests(QuestionnaireTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user('import_admin', is_staff=True)
+
+    def test_export_can_be_reimported(self):
+        seed_responses(2, 25, seed=12)
+        answers = ResponseOption.objects.count()
+        exports = {import_format: ''.join(iter_export(get_schema(), import_format, 'responses')) for import_format in IMPORT_FORMATS}
+        for import_format, exported in exports.items():
+            result = ingest(io.StringIO(exported), import_format, get_schema(), self.admin, batch_size=10)
+            self.assertEqual((result.created, result.rejected), (25, 0))
+        self.assertEqual(Response.objects.count(), 75)
+        self.assertEqual(ResponseOption.objects.count(), 3 * answers)
+        self.assertEqual(find_drift(), [])
+
+    def test_invalid_rows_are_reported_by_line(self):
+        schema = get_schema()
+        likert = next(question for question in schema.questions.values() if question.is_likert)
+        choice = next(question for question in schema.questions.values() if not question.is_text and not question.is_likert)
+        lines = [
+            json.dumps({likert.number: {likert.options[0].text: 4}, choice.number: choice.options[0].text}),
+            json.dumps({likert.number: {likert.options[0].text: 9}}),
+            '{pas du json',
+            json.dumps({choice.number: 'Option inconnue', 'username': 'personne'}),
+            json.dumps({'username': 'import_admin', choice.number: choice.options[1].text}),
+        ]
+        result = ingest(io.StringIO('\n'.join(lines)), 'ndjson', schema, self.admin)
+        self.assertEqual((result.created, result.rejected), (2, 3))
+        self.assertEqual([line for line, _ in result.errors], [2, 3, 4])
+        self.assertEqual(ResponseOption.objects.get(question_id=likert.id).likert_value, 4)
+
+        with self.assertRaises(IngestionError):
+            ingest(io.StringIO('Q01,Q99\nMasculin,x\n'), 'csv', schema, self.admin)
+
+    def test_likert_columns_by_option_text(self):
+        schema = get_schema()
+        likert = next(question for question in schema.questions.values() if question.is_likert)
+        self.assertEqual([option.id for option in likert.options], sorted(option.id for option in likert.options))
+        first, last = likert.options[0], likert.options[-1]
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow([f'{likert.number}:{last.text}', f'{likert.number}.1'])
+        writer.writerow([5, 2])
+        result = ingest(io.StringIO(output.getvalue()), 'csv', schema, self.admin)
+        self.assertEqual((result.created, result.rejected), (1, 0))
+        self.assertEqual(dict(ResponseOption.objects.values_list('option_id', 'likert_value')), {last.id: 5, first.id: 2})
+
+    def test_import_endpoint_reports_rejected_rows(self):
+        self.client.force_login(self.admin)
+        upload = io.BytesIO('Q01\nMasculin\nInconnu\n'.encode())
+        upload.name = 'papier.csv'
+        data = self.client.post(reverse('sondage:admin_import_responses'), {'file': upload}).json()
+        self.assertEqual((data['created'], data['rejected']), (1, 1))
+        self.assertEqual(data['errors'][0]['line'], 3)
+
+
+class SubmissionJournalTests(QuestionnaireTestCase):
+    def setUp(self):
+        super().setUp()
+        journal_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(journal_dir.cleanup)
+        settings_override = self.settings(SUBMISSION_JOURNAL=os.path.join(journal_dir.name, 'journal.sqlite3'))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create_user('journal_user')
+        self.client.force_login(self.user)
+
+    def submit(self, data):
+        return self.client.post(reverse('sondage:submit_survey'), data)
+
+    def test_submissions_are_saved_exactly_once(self):
+        rng = random.Random(13)
+        forms = [random_form_data(get_schema(), rng) for _ in range(5)]
+        token = str(uuid.uuid4())
+        for data in forms:
+            self.assertEqual(self.submit(data).status_code, 200)
+        # Double envoi du même formulaire : une seule réponse
+        self.submit({**forms[0], 'submission_token': token})
+        self.submit({**forms[0], 'submission_token': token})
+        self.assertEqual(Response.objects.count(), 0)
+        self.assertEqual(pending_submissions(), 6)
+
+        self.assertEqual(flush_submissions(batch_size=4), 6)
+        self.assertEqual(pending_submissions(), 0)
+        self.assertEqual(Response.objects.count(), 6)
+        self.assertEqual(find_drift(), [])
+
+        # Arrêt entre la validation d'un lot et son retrait du journal : rejoué sans doublon
+        append_submission(self.user, parse_submission(get_schema(), forms[0]), token)
+        self.assertEqual(flush_submissions(), 0)
+        self.assertEqual(Response.objects.count(), 6)
+        self.assertEqual(pending_submissions(), 0)
+
+    def test_direct_mode_deduplicates_tokens(self):
+        other = User.objects.create_user('journal_other')
+        with self.settings(SUBMISSION_JOURNAL=''):
+            data = {**random_form_data(get_schema(), random.Random(14)), 'submission_token': str(uuid.uuid4())}
+            self.submit(data)
+            self.submit(data)
+            # Même jeton chez un autre utilisateur : sa propre réponse, sous son jeton de repli
+            self.client.force_login(other)
+            self.submit(data)
+            self.submit(data)
+        self.assertEqual(Response.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(Response.objects.get(user=other).submission_token, user_token(data['submission_token'], other.pk))
+        self.assertEqual(find_drift(), [])
+
+    def test_concurrent_flush_and_shared_tokens(self):
+        other = User.objects.create_user('journal_other')
+        answers = parse_submission(get_schema(), random_form_data(get_schema(), random.Random(18)))
+        token, raced = uuid.uuid4(), uuid.uuid4()
+        append_submission(self.user, answers, token)
+        append_submission(other, answers, token)
+        append_submission(self.user, answers, raced)
+
+        # Un autre vidage valide `raced` entre la lecture des jetons et l'insertion du lot
+        def read_then_race(entries, read=journal._new_entries):
+            new = read(entries)
+            if not Response.objects.filter(submission_token=raced).exists():
+                save_submission(self.user, parse_submission(get_schema(), {}), raced)
+            return new
+
+        with mock.patch.object(journal, '_new_entries', side_effect=read_then_race):
+            self.assertEqual(flush_submissions(), 2)
+        self.assertEqual(pending_submissions(), 0)
+        self.assertEqual(
+            set(Response.objects.values_list('user_id', 'submission_token')),
+            {(self.user.pk, token), (other.pk, user_token(token, other.pk)), (self.user.pk, raced)},
+        )
+
+
+class TextSearchTests(QuestionnaireTestCase):
+    def setUp(self):
+        super().setUp()
+        seed_responses(2, 30, seed=15)
+        self.client.force_login(User.objects.create_user('search_admin', is_staff=True))
+        self.profession = Question.objects.get(number='Q00C')
+
+    def search(self, **params):
+        return self.client.get(reverse('sondage:api_search'), params)
+
+    def test_results_are_accent_insensitive_and_highlighted(self):
+        expected = ResponseOption.objects.filter(question=self.profession, text_response__startswith='Ingénieure')
+        self.assertTrue(expected.exists())
+        results = self.search(q='ingenieur', question='Q00C').json()['results']
+        self.assertEqual(sorted(result['id'] for result in results), sorted(expected.values_list('id', flat=True)))
+        self.assertTrue(all('<mark>Ingénieure</mark>' in result['highlight'] for result in results))
+
+    def test_index_follows_imports_and_escapes_answers(self):
+        # Insertions directes de l'import : l'index reste à jour sans passer par l'ORM
+        ingest(io.StringIO(json.dumps({'Q00C': 'Pharmacienne <script>'})), 'ndjson', get_schema(), User.objects.get(username='search_admin'))
+        [result] = self.search(q='pharmacien').json()['results']
+        self.assertEqual(result['highlight'], '<mark>Pharmacienne</mark> &lt;script&gt;')
+
+        ResponseOption.objects.filter(id=result['id']).update(text_response='Sage-femme')
+        self.assertEqual(self.search(q='pharmacien').json()['results'], [])
+        self.assertEqual(len(self.search(q='sage femme').json()['results']), 1)
+
+    def test_invalid_requests_are_rejected(self):
+        self.assertEqual(self.search(q='   ').status_code, 400)
+        self.assertEqual(self.search(q='"OR', question='Q01').status_code, 400)
+        self.assertEqual(self.search(q='"OR*').status_code, 200)
+
+
+class TermFrequencyTests(QuestionnaireTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('terms_admin', is_staff=True)
+        self.client.force_login(self.user)
+
+    def test_tokens_are_folded_without_stop_words(self):
+        self.assertEqual(tokenize("L'Ingénieure de l'école, 2 ÉLÈVES"), ['ingenieure', 'ecole', 'eleves'])
+        self.assertEqual(term_counts([(1, 'Agent de santé communautaire')])[(1, 2, 'sante communautaire')], 1)
+
+    def test_increments_are_batched_upserts(self):
+        question = Question.objects.get(number='Q00C')
+        increments = Counter({(question.id, 1, f'mot{index}'): 2 for index in range(450)})
+        increment_terms(increments)
+        # Tranches de TERMS_PER_QUERY termes, ajoutées aux fréquences existantes
+        with CaptureQueriesContext(connection) as captured:
+            increment_terms(increments)
+        self.assertEqual(len(captured.captured_queries), 3)
+        self.assertEqual(set(TermTally.objects.values_list('count', flat=True)), {4})
+
+    def test_incremental_updates_match_rebuild(self):
+        seed_responses(2, 20, seed=16)
+        ingest(io.StringIO('Q00C\nAgent de santé\nAgent de Santé communautaire\n'), 'csv', get_schema(), self.user)
+        data = random_form_data(get_schema(), random.Random(17))
+        data[f"question_{Question.objects.get(number='Q00C').id}"] = 'Agent santé'
+        self.client.post(reverse('sondage:submit_survey'), data)
+
+        incremental = set(TermTally.objects.filter(count__gt=0).values_list('question_id', 'n', 'term', 'count'))
+        rebuild_terms()
+        self.assertEqual(set(TermTally.objects.values_list('question_id', 'n', 'term', 'count')), incremental)
+
+        [question] = self.client.get(reverse('sondage:api_terms'), {'question': 'Q00C'}).json()['questions']
+        self.assertIn({'term': 'agent', 'count': 3}, question['terms'])
+        self.assertEqual(question['bigrams'][0], {'term': 'agent sante', 'count': 3})
+
+    def test_deleted_and_edited_answers_leave_the_terms(self):
+        seed_responses(2, 20, seed=27)
+        ingest(io.StringIO('Q00A,Q00C\nZéphyrine,Agent de santé\nAmadou,Agent de santé\n'), 'csv', get_schema(), self.user)
+        etag = self.client.get(reverse('sondage:api_terms'))['ETag']
+
+        ResponseOption.objects.get(text_response='Zéphyrine').response.delete()
+        edited = ResponseOption.objects.get(text_response='Amadou')
+        edited.text_response = 'Bintou'
+        edited.save()
+        ResponseOption.objects.filter(text_response='Agent de santé').first().delete()
+
+        incremental = set(TermTally.objects.values_list('question_id', 'n', 'term', 'count'))
+        rebuild_terms()
+        self.assertEqual(set(TermTally.objects.values_list('question_id', 'n', 'term', 'count')), incremental)
+        self.assertFalse(TermTally.objects.filter(term__in=['zephyrine', 'amadou']).exists())
+        self.assertTrue(TermTally.objects.filter(term='bintou').exists())
+
+        response = self.client.get(reverse('sondage:api_terms'), headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
@@ -14,8 +14,19 @@ urlpatterns = [
     path('register/', views.register_view, name='register'),
     path('logout/', views.logout_view, name='logout'),
     path('admin-stats/', views.admin_stats, name='admin_stats'),
+    path('admin-stats/questions/<int:question_id>/answers/', views.admin_text_answers, name='admin_text_answers'),
     path('admin-stats/word/', views.admin_stats_word, name='admin_stats_word'),
     path('admin-stats/pdf/', views.admin_stats_pdf, name='admin_stats_pdf'),
+    path('admin-stats/jobs/<int:job_id>/', views.report_job_status, name='report_job_status'),
+    path('admin-stats/jobs/<int:job_id>/download/', views.report_job_download, name='report_job_download'),
+    path('admin-stats/profile/', views.admin_profile, name='admin_profile'),
+    path('admin-stats/export/', views.admin_export_responses, name='admin_export_responses'),
+    path('admin-stats/import/', views.admin_import_responses, name='admin_import_responses'),
+    path('api/stats/', views.api_stats, name='api_stats'),
+    path('api/crosstab/', views.api_crosstab, name='api_crosstab'),
+    path('api/search/', views.api_search, name='api_search'),
+    path('api/terms/', views.api_terms, name='api_terms'),
+    path('api/stats/<str:number>/', views.api_stats, name='api_question_stats'),
 ]
 
 urlpatterns += staticfiles_urlpatterns()
\ No newline at end of file
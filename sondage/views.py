@@ -1,23 +1,43 @@
-from django.shortcuts import render, redirect
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
 from django.contrib import messages
 from django.contrib.auth.decorators import user_passes_test, login_required
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.models import User
-from .models import Section, Question, Option, Response, ResponseOption
-from django.db.models import Count, Avg
+from .models import Section, Question, Option, Response, ResponseOption, ReportJob
+from .aggregation import (
+    adata_version, aload_counts, api_question_stats, astats_version, atext_answers_page, build_report, data_version,
+)
+from .artifacts import find_artifact, stream_artifact
+from .crosstab import CrosstabError, crosstab_data
+from .schema import aget_schema, get_schema
+from .exports import EXPORT_FORMATS, EXPORT_LAYOUTS, aiter_export, iter_export
+from .ingestion import IMPORT_FORMATS, IngestionError, ingest
+from .jobs import enqueue_report, render_in_background
+from .profiling import view_stats
+from .reports import REPORT_FORMATS
+from .search import SEARCH_LIMIT, SearchError, search_answers
+from .terms import TOP_TERMS, terms_version, top_terms
+from .word import iter_docx
+from .journal import append_submission, journal_enabled
+from .submission import SubmissionError, parse_submission, save_submission, submission_token
+import codecs
 import os
 from django.conf import settings
-from django.http import HttpResponse
-from io import BytesIO
-from docx import Document
-from docx.shared import Inches, Pt
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, HttpResponseBadRequest, StreamingHttpResponse, FileResponse, JsonResponse, Http404
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_POST
+from django.views.decorators.vary import vary_on_cookie
+from datetime import datetime, timezone
+import hashlib
 
 def is_admin(user):
     return user.is_staff
@@ -73,51 +93,63 @@ def logout_view(request):
     messages.info(request, "Vous avez été déconnecté.")
     return redirect('sondage:login')
 
+def render_survey_questions(schema):
+    # Le corps du questionnaire ne dépend que de sa structure : rendu une fois par version
+    cache_key = f'sondage:survey_questions:{schema.digest}'
+    questions_html = cache.get(cache_key)
+    if questions_html is None:
+        questions_html = render_to_string('sondage/survey_questions.html', {'sections': schema.sections})
+        cache.set(cache_key, questions_html, timeout=None)
+    return mark_safe(questions_html)
+
+def survey_form_validators(request):
+    # Pas de revalidation quand des messages attendent d'être affichés ou sans jeton CSRF établi
+    if not hasattr(request, '_survey_form_validators'):
+        csrf_secret = request.META.get('CSRF_COOKIE')
+        if not request.user.is_authenticated or not csrf_secret or len(messages.get_messages(request)):
+            request._survey_form_validators = None
+        else:
+            schema = get_schema()
+            etag = hashlib.sha256(f'{schema.digest}:{request.user.pk}:{csrf_secret}'.encode()).hexdigest()[:32]
+            last_modified = datetime.fromtimestamp(schema.version / 1e9, tz=timezone.utc)
+            request._survey_form_validators = (etag, last_modified)
+    return request._survey_form_validators
+
+def survey_form_etag(request):
+    validators = survey_form_validators(request)
+    return validators[0] if validators else None
+
+def survey_form_last_modified(request):
+    validators = survey_form_validators(request)
+    return validators[1] if validators else None
+
 @login_required
+@vary_on_cookie
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=survey_form_etag, last_modified_func=survey_form_last_modified)
 def survey_form(request):
-    sections = Section.objects.all().prefetch_related('questions__options')
-    return render(request, 'sondage/survey_form.html', {'sections': sections})
+    schema = get_schema()
+    return render(request, 'sondage/survey_form.html', {'questions_html': render_survey_questions(schema)})
 
 @login_required
 def submit_survey(request):
     if request.method == 'POST':
-        response = Response.objects.create(user=request.user)
-        
-        for question in Question.objects.all():
-            if question.is_text:
-                field_name = f'question_{question.id}'
-                if field_name in request.POST:
-                    text_response = request.POST.get(field_name)
-                    ResponseOption.objects.create(
-                        response=response,
-                        question=question,
-                        text_response=text_response
-                    )
-            elif question.is_likert:
-                for option in question.options.all():
-                    field_name = f'question_{question.id}_{option.id}'
-                    if field_name in request.POST:
-                        likert_value = int(request.POST.get(field_name))
-                        ResponseOption.objects.create(
-                            response=response,
-                            question=question,
-                            option=option,
-                            likert_value=likert_value
-                        )
-            else:
-                field_name = f'question_{question.id}'
-                if field_name in request.POST:
-                    option_id = request.POST.get(field_name)
-                    try:
-                        option = Option.objects.get(id=option_id, question=question)
-                        ResponseOption.objects.create(
-                            response=response,
-                            question=question,
-                            option=option
-                        )
-                    except Option.DoesNotExist:
-                        messages.error(request, f"Option invalide pour la question {question.number}")
-                        return redirect('sondage:survey_form')
+        try:
+            answers = parse_submission(get_schema(), request.POST)
+        except SubmissionError as e:
+            messages.error(request, str(e))
+            return redirect('sondage:survey_form')
+
+        token = submission_token(request.POST)
+        if journal_enabled():
+            # Mode différé : acquittée dès l'écriture dans le journal local, enregistrée par flush_submissions
+            append_submission(request.user, answers, token)
+        else:
+            try:
+                save_submission(request.user, answers, token)
+            except SubmissionError as e:
+                messages.error(request, str(e))
+                return redirect('sondage:survey_form')
         
         messages.success(request, "Merci pour votre participation !")
         return render(request, 'sondage/thank_you.html')
@@ -126,74 +158,7 @@ def submit_survey(request):
 
 @login_required
 def generate_report(request):
-    sections = Section.objects.all().prefetch_related('questions__options')
-    report_data = []
-    
-    for section in sections:
-        section_data = {
-            'name': section.name,
-            'questions': []
-        }
-        
-        for question in section.questions.all():
-            if question.is_text:
-                responses = ResponseOption.objects.filter(question=question).values_list('text_response', flat=True)
-                question_data = {
-                    'question': question,
-                    'type': 'text',
-                    'responses': list(responses)
-                }
-            elif question.is_likert:
-                options_data = []
-                for option in question.options.all():
-                    responses = ResponseOption.objects.filter(
-                        question=question, 
-                        option=option
-                    ).values('likert_value').annotate(count=Count('likert_value')).order_by('likert_value')
-                    
-                    scale_counts = {str(i): 0 for i in range(0, 6)}  # De 0 à 5
-                    for response in responses:
-                        if response['likert_value'] is not None:
-                            scale_counts[str(response['likert_value'])] = response['count']
-                    
-                    total = sum(int(value) * count for value, count in scale_counts.items())
-                    count = sum(scale_counts.values())
-                    average = round(total / count, 2) if count > 0 else 0
-                    
-                    options_data.append({
-                        'option': option.text,
-                        'average': average,
-                        'scale_counts': scale_counts,
-                        'total_responses': count
-                    })
-                
-                question_data = {
-                    'question': question,
-                    'type': 'likert',
-                    'options_data': options_data
-                }
-            else:
-                responses = ResponseOption.objects.filter(question=question).values('option__text').annotate(
-                    count=Count('option')
-                ).order_by('-count')
-                
-                total = sum(r['count'] for r in responses)
-                question_data = {
-                    'question': question,
-                    'type': 'multiple_choice',
-                    'responses': [
-                        {
-                            'option': r['option__text'],
-                            'count': r['count'],
-                            'percentage': round((r['count'] / total * 100) if total > 0 else 0, 1)
-                        }
-                        for r in responses
-                    ]
-                }
-            
-            section_data['questions'].append(question_data)
-        
-        report_data.append(section_data)
+    report_data = build_report()
 
     return render(request, 'sondage/report.html', {
         'sections': report_data
@@ -202,264 +167,271 @@ def generate_report(request):
 @login_required
 @user_passes_test(is_admin)
 def admin_stats(request):
-    responses = Response.objects.select_related('user').prefetch_related(
-        'selected_options',
-        'selected_options__question'
-    ).order_by('-created_at')
-    
-    sections = Section.objects.all().prefetch_related('questions__options')
-    report_data = []
-    
-    for section in sections:
-        section_data = {
-            'name': section.name,
-            'questions': []
-        }
-        
-        for question in section.questions.all():
-            if question.is_text:
-                responses = ResponseOption.objects.filter(question=question).values_list('text_response', flat=True)
-                question_data = {
-                    'question': question,
-                    'type': 'text',
-                    'responses': list(responses)
-                }
-            elif question.is_likert:
-                options_data = []
-                for option in question.options.all():
-                    responses = ResponseOption.objects.filter(
-                        question=question, 
-                        option=option
-                    ).values('likert_value').annotate(count=Count('likert_value')).order_by('likert_value')
-                    
-                    scale_counts = {str(i): 0 for i in range(0, 6)}  # De 0 à 5
-                    for response in responses:
-                        if response['likert_value'] is not None:
-                            scale_counts[str(response['likert_value'])] = response['count']
-                    
-                    total = sum(int(value) * count for value, count in scale_counts.items())
-                    count = sum(scale_counts.values())
-                    average = round(total / count, 2) if count > 0 else 0
-                    
-                    options_data.append({
-                        'option': option.text,
-                        'average': average,
-                        'scale_counts': scale_counts,
-                        'total_responses': count
-                    })
-                
-                question_data = {
-                    'question': question,
-                    'type': 'likert',
-                    'options_data': options_data
-                }
-            else:
-                responses = ResponseOption.objects.filter(question=question).values('option__text').annotate(
-                    count=Count('option')
-                ).order_by('-count')
-                
-                total = sum(r['count'] for r in responses)
-                question_data = {
-                    'question': question,
-                    'type': 'multiple_choice',
-                    'responses': [
-                        {
-                            'option': r['option__text'],
-                            'count': r['count'],
-                            'percentage': round((r['count'] / total * 100) if total > 0 else 0, 1)
-                        }
-                        for r in responses
-                    ]
-                }
-            
-            section_data['questions'].append(question_data)
-        
-        report_data.append(section_data)
+    # Page légère : seule la structure est rendue, les statistiques sont chargées à la demande
+    schema = get_schema()
 
     return render(request, 'sondage/admin_stats.html', {
-        'responses': responses,
-        'sections': report_data
+        'sections': schema.sections,
+        'total_responses': Response.objects.count()
     })
 
+API_STATS_FIELDS = ('id', 'number', 'text', 'section', 'type', 'total', 'options')
+
 @login_required
 @user_passes_test(is_admin)
-def admin_stats_word(request):
-    sections = Section.objects.all().prefetch_related('questions__options')
-    doc = Document()
-    
-    # Titre du document
-    title = doc.add_heading('Rapport des statistiques', 0)
-    title.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    
-    for section in sections:
-        # Titre de la section
-        doc.add_heading(section.name, level=1)
-        
-        for question in section.questions.all():
-            # Titre de la question
-            doc.add_heading(question.text, level=2)
-            
-            if question.is_text:
-                responses = ResponseOption.objects.filter(question=question).values_list('text_response', flat=True)
-                for response in responses:
-                    doc.add_paragraph(response)
-            
-            elif question.is_likert:
-                table = doc.add_table(rows=1, cols=3)
-                table.style = 'Table Grid'
-                hdr_cells = table.rows[0].cells
-                hdr_cells[0].text = 'Option'
-                hdr_cells[1].text = 'Moyenne'
-                hdr_cells[2].text = 'Total réponses'
-                
-                for option in question.options.all():
-                    responses = ResponseOption.objects.filter(
-                        question=question, 
-                        option=option
-                    ).values('likert_value').annotate(count=Count('likert_value'))
-                    
-                    scale_counts = {str(i): 0 for i in range(0, 6)}  # De 0 à 5
-                    for response in responses:
-                        if response['likert_value'] is not None:
-                            scale_counts[str(response['likert_value'])] = response['count']
-                    
-                    total = sum(r['count'] for r in responses)
-                    sum_values = sum(r['likert_value'] * r['count'] for r in responses)
-                    average = round(sum_values / total, 2) if total > 0 else 0
-                    
-                    row_cells = table.add_row().cells
-                    row_cells[0].text = option.text
-                    row_cells[1].text = str(average)
-                    row_cells[2].text = str(total)
-            
-            else:
-                table = doc.add_table(rows=1, cols=3)
-                table.style = 'Table Grid'
-                hdr_cells = table.rows[0].cells
-                hdr_cells[0].text = 'Option'
-                hdr_cells[1].text = 'Nombre'
-                hdr_cells[2].text = 'Pourcentage'
-                
-                responses = ResponseOption.objects.filter(question=question).values('option__text').annotate(
-                    count=Count('option')
-                ).order_by('-count')
-                
-                total = sum(r['count'] for r in responses)
-                for r in responses:
-                    row_cells = table.add_row().cells
-                    row_cells[0].text = r['option__text']
-                    row_cells[1].text = str(r['count'])
-                    row_cells[2].text = f"{round((r['count'] / total * 100) if total > 0 else 0, 1)}%"
-    
-    # Sauvegarder le document
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document')
-    response['Content-Disposition'] = 'attachment; filename=statistiques.docx'
-    doc.save(response)
+@cache_control(private=True, no_cache=True)
+async def api_stats(request, number=None):
+    # Vues async : lectures via l'ORM async, sans bloquer un worker pendant les accès à la base
+    version = await astats_version()
+    etag = quote_etag(version)
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        return response
+
+    schema = await aget_schema()
+    if number is not None:
+        questions = [question for question in schema.questions.values() if question.number == number]
+        if not questions:
+            raise Http404("Question introuvable.")
+    else:
+        questions = list(schema.questions.values())
+        if request.GET.get('section'):
+            questions = [question for question in questions if str(question.section_id) == request.GET['section']]
+        if request.GET.get('questions'):
+            numbers = set(request.GET['questions'].split(','))
+            questions = [question for question in questions if question.number in numbers]
+
+    fields = API_STATS_FIELDS
+    if request.GET.get('fields'):
+        fields = tuple(request.GET['fields'].split(','))
+        unknown = set(fields) - set(API_STATS_FIELDS)
+        if unknown:
+            return HttpResponseBadRequest(f"Champs inconnus : {', '.join(sorted(unknown))}")
+
+    # Les compteurs ne sont lus que si le client les demande
+    counts = await aload_counts([question.id for question in questions]) if {'total', 'options'} & set(fields) else {}
+    data = [api_question_stats(question, counts.get(question.id, {})) for question in questions]
+    data = [{field: item[field] for field in fields if field in item} for item in data]
+
+    if number is not None:
+        response = JsonResponse({'version': version, 'question': data[0]})
+    else:
+        response = JsonResponse({'version': version, 'questions': data})
+    response['ETag'] = etag
     return response
 
 @login_required
 @user_passes_test(is_admin)
-def admin_stats_pdf(request):
-    sections = Section.objects.all().prefetch_related('questions__options')
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    elements = []
-    styles = getSampleStyleSheet()
-    
-    # Titre du document
-    title = Paragraph("Rapport des statistiques", styles['Title'])
-    elements.append(title)
-    elements.append(Spacer(1, 12))
-    
-    for section in sections:
-        # Titre de la section
-        section_title = Paragraph(section.name, styles['Heading1'])
-        elements.append(section_title)
-        elements.append(Spacer(1, 12))
-        
-        for question in section.questions.all():
-            # Titre de la question
-            question_title = Paragraph(question.text, styles['Heading2'])
-            elements.append(question_title)
-            elements.append(Spacer(1, 12))
-            
-            if question.is_text:
-                responses = ResponseOption.objects.filter(question=question).values_list('text_response', flat=True)
-                for response in responses:
-                    elements.append(Paragraph(response, styles['Normal']))
-                    elements.append(Spacer(1, 6))
-            
-            elif question.is_likert:
-                data = [['Option', 'Moyenne', 'Total réponses']]
-                for option in question.options.all():
-                    responses = ResponseOption.objects.filter(
-                        question=question, 
-                        option=option
-                    ).values('likert_value').annotate(count=Count('likert_value'))
-                    
-                    scale_counts = {str(i): 0 for i in range(0, 6)}  # De 0 à 5
-                    for response in responses:
-                        if response['likert_value'] is not None:
-                            scale_counts[str(response['likert_value'])] = response['count']
-                    
-                    total = sum(r['count'] for r in responses)
-                    sum_values = sum(r['likert_value'] * r['count'] for r in responses)
-                    average = round(sum_values / total, 2) if total > 0 else 0
-                    
-                    data.append([option.text, str(average), str(total)])
-                
-                table = Table(data)
-                table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 14),
-                    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                    ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-                    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-                    ('FONTSIZE', (0, 1), (-1, -1), 12),
-                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.black)
-                ]))
-                elements.append(table)
-                elements.append(Spacer(1, 12))
-            
-            else:
-                data = [['Option', 'Nombre', 'Pourcentage']]
-                responses = ResponseOption.objects.filter(question=question).values('option__text').annotate(
-                    count=Count('option')
-                ).order_by('-count')
-                
-                total = sum(r['count'] for r in responses)
-                for r in responses:
-                    percentage = round((r['count'] / total * 100) if total > 0 else 0, 1)
-                    data.append([r['option__text'], str(r['count']), f"{percentage}%"])
-                
-                table = Table(data)
-                table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 14),
-                    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                    ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-                    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-                    ('FONTSIZE', (0, 1), (-1, -1), 12),
-                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.black)
-                ]))
-                elements.append(table)
-                elements.append(Spacer(1, 12))
-    
-    doc.build(elements)
-    pdf = buffer.getvalue()
-    buffer.close()
-    
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = 'attachment; filename=statistiques.pdf'
-    response.write(pdf)
+async def admin_text_answers(request, question_id):
+    question = (await aget_schema()).questions.get(question_id)
+    if question is None or not question.is_text:
+        raise Http404("Question texte introuvable.")
+    try:
+        after = int(request.GET.get('after', 0))
+        limit = min(max(int(request.GET.get('limit', 50)), 1), 200)
+    except ValueError:
+        return HttpResponseBadRequest("Paramètres de pagination invalides.")
+
+    return JsonResponse(await atext_answers_page(question.id, after, limit))
+
+@login_required
+@user_passes_test(is_admin)
+@cache_control(private=True, no_cache=True)
+def api_crosstab(request):
+    # Calcul NumPy en mémoire : vue synchrone, exécutée hors de la boucle d'événements sous ASGI
+    if not request.GET.get('question') or not request.GET.get('by'):
+        return HttpResponseBadRequest("Paramètres question et by requis.")
+    version = data_version()
+    etag = quote_etag(version)
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        return response
+    try:
+        data = crosstab_data(request.GET['question'], request.GET['by'], request.GET.getlist('filter'), version)
+    except CrosstabError as e:
+        return HttpResponseBadRequest(str(e))
+
+    response = JsonResponse(data)
+    response['ETag'] = etag
+    return response
+
+@login_required
+@user_passes_test(is_admin)
+@require_POST
+def admin_import_responses(request):
+    # Fichier multipart ou corps brut, lus ligne par ligne : le lot n'est jamais chargé entier en mémoire
+    upload = request.FILES.get('file')
+    name = upload.name if upload else ''
+    import_format = request.GET.get('format') or os.path.splitext(name)[1].lstrip('.').lower()
+    if not import_format and 'ndjson' in request.content_type:
+        import_format = 'ndjson'
+    elif not import_format and request.content_type == 'text/csv':
+        import_format = 'csv'
+    if import_format not in IMPORT_FORMATS:
+        return HttpResponseBadRequest("Format d'import invalide (csv ou ndjson).")
+
+    lines = codecs.iterdecode(upload if upload else request, 'utf-8-sig')
+    try:
+        result = ingest(lines, import_format, get_schema(), request.user)
+    except IngestionError as e:
+        return HttpResponseBadRequest(str(e))
+    except UnicodeDecodeError:
+        return HttpResponseBadRequest("Le fichier doit être encodé en UTF-8.")
+    return JsonResponse({
+        'created': result.created,
+        'rejected': result.rejected,
+        'errors': [{'line': line, 'message': message} for line, message in result.errors],
+    })
+
+@login_required
+@user_passes_test(is_admin)
+@cache_control(private=True, no_cache=True)
+def api_search(request):
+    # Recherche plein texte dans les réponses libres, éventuellement limitée à une question
+    limit = request.GET.get('limit', str(SEARCH_LIMIT))
+    if not limit.isdigit():
+        return HttpResponseBadRequest("Paramètre limit invalide.")
+    try:
+        results = search_answers(get_schema(), request.GET.get('q', ''), request.GET.get('question'), int(limit))
+    except SearchError as e:
+        return HttpResponseBadRequest(str(e))
+    return JsonResponse({'query': request.GET.get('q', ''), 'results': results})
+
+@login_required
+@user_passes_test(is_admin)
+@cache_control(private=True, no_cache=True)
+def api_terms(request):
+    # Mots et bigrammes les plus fréquents des réponses libres, lus dans les tables de fréquences
+    etag = quote_etag(terms_version())
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        return response
+
+    questions = [question for question in get_schema().questions.values() if question.is_text]
+    if request.GET.get('question'):
+        questions = [question for question in questions if question.number == request.GET['question']]
+        if not questions:
+            raise Http404("Question texte introuvable.")
+    limit = request.GET.get('limit', str(TOP_TERMS))
+    if not limit.isdigit() or not 0 < int(limit) <= 100:
+        return HttpResponseBadRequest("Paramètre limit invalide (1 à 100).")
+
+    response = JsonResponse({'questions': top_terms(questions, int(limit))})
+    response['ETag'] = etag
+    return response
+
+@login_required
+@user_passes_test(is_admin)
+def admin_profile(request):
+    # Compteurs du middleware de profilage pour chaque vue nommée de l'application
+    from . import urls
+    view_names = [f'{urls.app_name}:{pattern.name}' for pattern in urls.urlpatterns if getattr(pattern, 'name', None)]
+    return JsonResponse({'views': view_stats(view_names)})
+
+def serve_artifact(request, kind, path):
+    # Le nom du fichier est dérivé de la version des données : il sert directement d'ETag
+    etag = quote_etag(os.path.splitext(os.path.basename(path))[0])
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        extension, content_type = REPORT_FORMATS[kind]
+        response = FileResponse(
+            open(path, 'rb'),
+            as_attachment=True,
+            filename=f'statistiques.{extension}',
+            content_type=content_type
+        )
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+async def request_report(request, kind):
+    version = await adata_version()
+    path = find_artifact(kind, version)
+    if path is not None:
+        return serve_artifact(request, kind, path)
+
+    # enqueue_report s'appuie sur une transaction, non supportée par l'ORM async
+    job = await sync_to_async(enqueue_report)(kind, await request.auser(), fingerprint=version)
+    if job.status == ReportJob.STATUS_DONE:
+        return redirect('sondage:report_job_download', job_id=job.pk)
+    render_in_background(job)
+    return await sync_to_async(render)(request, 'sondage/report_job.html', {'job': job})
+
+def word_report_chunks(version):
+    # Rien n'est lu avant le premier morceau demandé ; le fichier produit alimente aussi le cache d'artefacts
+    def rendered_version():
+        # Réponses arrivées pendant le flux : le fichier ne correspond plus à `version`, il n'est pas conservé
+        return version if data_version() == version else None
+
+    yield from stream_artifact('word', rendered_version, iter_docx(build_report(lazy_texts=True)))
+
+async def aiter_sync(iterator):
+    # Même thread pour chaque morceau : les curseurs côté serveur sont liés à la connexion de ce thread
+    sentinel = object()
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    try:
+        while (chunk := await next_chunk(iterator, sentinel)) is not sentinel:
+            yield chunk
+    finally:
+        await sync_to_async(iterator.close, thread_sensitive=True)()
+
+@login_required
+@user_passes_test(is_admin)
+async def admin_stats_word(request):
+    # Le .docx est écrit au fil de l'eau : pas de job, mémoire constante quel que soit le volume
+    version = await adata_version()
+    path = find_artifact('word', version)
+    if path is not None:
+        return serve_artifact(request, 'word', path)
+
+    chunks = word_report_chunks(version)
+    extension, content_type = REPORT_FORMATS['word']
+    response = StreamingHttpResponse(
+        aiter_sync(chunks) if isinstance(request, ASGIRequest) else chunks,
+        content_type=content_type
+    )
+    response['Content-Disposition'] = f'attachment; filename=statistiques.{extension}'
+    return response
+
+@login_required
+@user_passes_test(is_admin)
+async def admin_stats_pdf(request):
+    return await request_report(request, 'pdf')
+
+@login_required
+@user_passes_test(is_admin)
+async def report_job_status(request, job_id):
+    job = await aget_object_or_404(ReportJob, pk=job_id)
+    return JsonResponse({
+        'id': job.pk,
+        'kind': job.kind,
+        'status': job.status,
+        'error': job.error,
+        'download_url': reverse('sondage:report_job_download', args=[job.pk]) if job.status == ReportJob.STATUS_DONE else None,
+    })
+
+@login_required
+@user_passes_test(is_admin)
+async def report_job_download(request, job_id):
+    job = await aget_object_or_404(ReportJob, pk=job_id, status=ReportJob.STATUS_DONE)
+    if not os.path.exists(job.file_path):
+        raise Http404("Le fichier du rapport n'existe plus.")
+    return serve_artifact(request, job.kind, job.file_path)
+
+@login_required
+@user_passes_test(is_admin)
+async def admin_export_responses(request):
+    export_format = request.GET.get('format', 'csv')
+    layout = request.GET.get('layout', 'responses')
+    if export_format not in EXPORT_FORMATS or layout not in EXPORT_LAYOUTS:
+        return HttpResponseBadRequest("Format ou disposition d'export invalide.")
+
+    # Sous ASGI, itérateur async ; sous WSGI, un itérateur async serait entièrement bufferisé en mémoire
+    schema = await aget_schema()
+    chunks = aiter_export(schema, export_format, layout) if isinstance(request, ASGIRequest) else iter_export(schema, export_format, layout)
+    response = StreamingHttpResponse(
+        chunks,
+        content_type=EXPORT_FORMATS[export_format]
+    )
+    response['Content-Disposition'] = f'attachment; filename=reponses-{layout}.{export_format}'
     return response
@@ -0,0 +1,155 @@
+import os
+import re
+import zipfile
+from functools import lru_cache
+from xml.sax.saxutils import escape
+
+import docx
+
+from .likert import LIKERT_HEADERS, likert_row
+
+# Le modèle par défaut de python-docx fournit styles, thème et types de contenu : seul document.xml est produit ici
+TEMPLATE_PATH = os.path.join(os.path.dirname(docx.__file__), 'templates', 'default.docx')
+DOCUMENT_PART = 'word/document.xml'
+CHUNK_SIZE = 64 * 1024
+
+# Largeur utile de la page du modèle (12240 - 2 x 1800 twips), répartie également entre les colonnes
+TEXT_WIDTH = 8640
+TABLE_LOOK = (
+    '<w:tblLook w:firstColumn="1" w:firstRow="1" w:lastColumn="0" w:lastRow="0" '
+    'w:noHBand="0" w:noVBand="1" w:val="04A0"/>'
+)
+# Caractères de contrôle interdits en XML 1.0
+INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+
+@lru_cache(maxsize=1)
+def template():
+    """Parties du modèle à recopier telles quelles, plus l'en-tête et la fin de document.xml."""
+    with zipfile.ZipFile(TEMPLATE_PATH) as archive:
+        parts = [(info.filename, archive.read(info)) for info in archive.infolist() if info.filename != DOCUMENT_PART]
+        document = archive.read(DOCUMENT_PART).decode('utf-8')
+    head = document[:document.index('<w:body>') + len('<w:body>')]
+    section = re.search(r'<w:sectPr.*</w:sectPr>', document, re.S).group(0)
+    return parts, head, re.sub(r'>\s+<', '><', section) + '</w:body></w:document>'
+
+
+def run(text):
+    # Réponse ou libellé absent : cellule vide, pas le texte « None »
+    text = INVALID_XML_CHARS.sub('', '' if text is None else str(text))
+    if not text:
+        return ''
+    space = ' xml:space="preserve"' if text != text.strip() else ''
+    return f'<w:r><w:t{space}>{escape(text)}</w:t></w:r>'
+
+
+def paragraph(text, style=None, center=False):
+    properties = ''
+    if style or center:
+        properties = '<w:pPr>{}{}</w:pPr>'.format(
+            f'<w:pStyle w:val="{style}"/>' if style else '',
+            '<w:jc w:val="center"/>' if center else '',
+        )
+    return f'<w:p>{properties}{run(text)}</w:p>'
+
+
+def heading(text, level):
+    # Mêmes styles que Document.add_heading : niveau 0 = titre du document
+    return paragraph(text, 'Title' if level == 0 else f'Heading{level}', center=level == 0)
+
+
+def table_start(columns):
+    width = TEXT_WIDTH // columns
+    grid = ''.join(f'<w:gridCol w:w="{width}"/>' for _ in range(columns))
+    return (
+        f'<w:tbl><w:tblPr><w:tblStyle w:val="TableGrid"/><w:tblW w:type="auto" w:w="0"/>{TABLE_LOOK}</w:tblPr>'
+        f'<w:tblGrid>{grid}</w:tblGrid>'
+    )
+
+
+def table_row(cells):
+    width = TEXT_WIDTH // len(cells)
+    return '<w:tr>{}</w:tr>'.format(''.join(
+        f'<w:tc><w:tcPr><w:tcW w:type="dxa" w:w="{width}"/></w:tcPr><w:p>{run(cell)}</w:p></w:tc>'
+        for cell in cells
+    ))
+
+
+def table(header, rows):
+    yield table_start(len(header))
+    yield table_row(header)
+    for row in rows:
+        yield table_row(row)
+    yield '</w:tbl>'
+
+
+def document_body(report_data):
+    """Fragments XML du corps du rapport, dans la même mise en page que l'ancien export python-docx."""
+    yield heading('Rapport des statistiques', 0)
+
+    for section in report_data:
+        yield heading(section['name'], 1)
+
+        for question_data in section['questions']:
+            yield heading(question_data['question'].text, 2)
+
+            if question_data['type'] == 'text':
+                # Peut être un itérateur sur la base : les réponses ne sont jamais toutes en mémoire
+                for response in question_data['responses']:
+                    yield paragraph(response)
+
+            elif question_data['type'] == 'likert':
+                yield from table(LIKERT_HEADERS, (
+                    likert_row(option_data) for option_data in question_data['options_data']
+                ))
+
+            else:
+                yield from table(['Option', 'Nombre', 'Pourcentage'], (
+                    [r['option'], str(r['count']), f"{r['percentage']}%"]
+                    for r in question_data['responses']
+                ))
+
+
+class _Sink:
+    # Flux non positionnable : zipfile écrit alors des descripteurs de données après chaque entrée
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def iter_docx(report_data, chunk_size=CHUNK_SIZE):
+    """Produit le fichier .docx par morceaux d'octets, en mémoire constante quel que soit le nombre de réponses."""
+    parts, head, tail = template()
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, data in parts:
+            archive.writestr(name, data)
+        yield sink.drain()
+
+        with archive.open(DOCUMENT_PART, 'w', force_zip64=True) as document:
+            buffer = [head]
+            size = len(head)
+            for fragment in document_body(report_data):
+                buffer.append(fragment)
+                size += len(fragment)
+                if size >= chunk_size:
+                    document.write(''.join(buffer).encode('utf-8'))
+                    buffer.clear()
+                    size = 0
+                    data = sink.drain()
+                    if data:
+                        yield data
+            buffer.append(tail)
+            document.write(''.join(buffer).encode('utf-8'))
+    yield sink.drain()
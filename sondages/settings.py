@@ -43,6 +43,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'sondage.profiling.ProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -84,6 +85,14 @@ DATABASES = {
     'default': dj_database_url.parse(config('DATABASE_URL'))
 }
 
+# Cache partagé entre les workers gunicorn (version du questionnaire, fragments)
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': config('CACHE_LOCATION', default=os.path.join(BASE_DIR, '.cache')),
+    }
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -120,6 +129,24 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATIC_ROOT = config('STATIC_ROOT', default=os.path.join(BASE_DIR, 'staticfiles'))
 
+# Rapports Word/PDF générés en arrière-plan (commande run_report_jobs)
+REPORTS_ROOT = config('REPORTS_ROOT', default=os.path.join(BASE_DIR, 'reports'))
+REPORTS_MAX_AGE = config('REPORTS_MAX_AGE', default=7 * 24 * 3600, cast=int)  # secondes
+REPORTS_MAX_BYTES = config('REPORTS_MAX_BYTES', default=500 * 1024 * 1024, cast=int)
+# Rapports générés directement par le processus web, dans un pool borné (0 : uniquement par run_report_jobs)
+REPORT_RENDER_WORKERS = config('REPORT_RENDER_WORKERS', default=2, cast=int)
+# Processus utilisés pour rendre les parties d'un rapport PDF (0 : un par cœur)
+REPORT_PDF_PROCESSES = config('REPORT_PDF_PROCESSES', default=0, cast=int)
+
+# Journal SQLite des soumissions en mode différé (vidé par flush_submissions) ; vide : écriture directe en base
+SUBMISSION_JOURNAL = config('SUBMISSION_JOURNAL', default='')
+
+# Instantané en colonnes des réponses (commande snapshot_responses), lu par les tableaux croisés
+SNAPSHOT_ROOT = config('SNAPSHOT_ROOT', default=os.path.join(BASE_DIR, 'snapshot'))
+
+# Les requêtes plus lentes sont journalisées avec leurs formes SQL les plus répétées
+PROFILE_SLOW_REQUEST_MS = config('PROFILE_SLOW_REQUEST_MS', default=500, cast=int)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 